@@ -0,0 +1,234 @@
+"""Admission control for the expensive routes.
+
+The cost of a request is estimated before anything is parsed: its number of
+lines and (decompressed) bytes, and the number of addresses its prefixes
+cover, worked out from the prefix lengths alone. Inputs over the hard limits are refused (413), clients
+over their budget have to wait (429), and large inputs that are otherwise
+fine can be sent to the background jobs instead of holding up a worker.
+"""
+import ipaddress
+import os
+import re
+import threading
+import time
+from collections import Counter
+from typing import BinaryIO, Dict, Iterable, NamedTuple, Optional, Tuple
+
+from uploads import MAX_LINE_LENGTH, iter_upload_chunks
+
+# Inputs with more lines are refused
+MAX_LINES = int(os.environ.get('IP_TOOLS_MAX_LINES', 5_000_000))
+
+# Inputs with more bytes, after decompression, are refused (0 for no limit)
+MAX_BYTES = int(os.environ.get('IP_TOOLS_MAX_BYTES', 256 << 20))
+
+# Inputs covering more addresses are refused (0 for no limit)
+MAX_ADDRESSES = int(os.environ.get('IP_TOOLS_MAX_ADDRESSES', 0))
+
+# Larger inputs run as background jobs, on the routes that have a job type for them
+INLINE_LINES = int(os.environ.get('IP_TOOLS_INLINE_LINES', 500_000))
+
+# Input lines and bytes each client may send per window of seconds (0 for no limit)
+CLIENT_BUDGET = int(os.environ.get('IP_TOOLS_CLIENT_BUDGET', 10_000_000))
+CLIENT_BYTE_BUDGET = int(os.environ.get('IP_TOOLS_CLIENT_BYTE_BUDGET', 1 << 30))
+CLIENT_WINDOW = int(os.environ.get('IP_TOOLS_CLIENT_WINDOW', 60))
+
+# Reverse proxies whose X-Real-IP header is trusted to name the client
+TRUSTED_PROXIES = [ipaddress.ip_network(network.strip(), strict=False)
+                   for network in os.environ.get('IP_TOOLS_TRUSTED_PROXIES', '127.0.0.1,::1').split(',')
+                   if network.strip()]
+
+# Clients tracked before those with a full budget again are forgotten
+CLIENT_LIMIT = 10_000
+
+# Prefix length at the end of a line, and the same for lines with a colon (IPv6)
+PREFIX_LENGTH = re.compile(rb'/[ \t]*(\d{1,3})[ \t\r]*$', re.M)
+IPV6_PREFIX_LENGTH = re.compile(rb':[^\n/]*/[ \t]*(\d{1,3})[ \t\r]*$', re.M)
+
+
+class CostEstimate(NamedTuple):
+    lines: int
+    # None when the input is not a list of prefixes (JSON batches)
+    addresses: Optional[int] = None
+    # Input size after decompression, 0 when the input was already parsed (JSON batches)
+    bytes: int = 0
+
+    def to_dict(self) -> dict:
+        return self._asdict()
+
+
+def combine_estimates(*estimates: CostEstimate) -> CostEstimate:
+    addresses = [estimate.addresses for estimate in estimates if estimate.addresses is not None]
+    return CostEstimate(sum(estimate.lines for estimate in estimates), sum(addresses) if addresses else None,
+                        sum(estimate.bytes for estimate in estimates))
+
+
+def estimate_chunks(chunks: Iterable[bytes], limit: int = MAX_LINES, byte_limit: int = MAX_BYTES) -> CostEstimate:
+    """Count the lines and bytes of an input and the addresses its prefixes cover, without parsing it.
+
+    Lines without a prefix length count as one address, each /n line as
+    2^(32-n) or 2^(128-n) addresses. Counting stops early once the input has
+    more lines or bytes than the limits, which is enough to refuse it.
+    """
+    lines = 0
+    size = 0
+    prefixes: Counter = Counter()
+    ipv6_prefixes: Counter = Counter()
+    pending = b''
+
+    def count(data: bytes) -> None:
+        prefixes.update(PREFIX_LENGTH.findall(data))
+        ipv6_prefixes.update(IPV6_PREFIX_LENGTH.findall(data))
+
+    for chunk in chunks:
+        # Only whole lines are counted, the rest waits for the next chunk
+        size += len(chunk)
+        data = pending + chunk
+        end = data.rfind(b'\n') + 1
+        pending = data[end:]
+        lines += data.count(b'\n', 0, end)
+        count(data[:end])
+        if len(pending) > MAX_LINE_LENGTH:
+            # Not a CIDR, counted as a line of its own so it cannot grow without bound
+            lines += 1
+            pending = b''
+        if lines > limit or (byte_limit and size > byte_limit):
+            break
+    else:
+        if pending.strip():
+            lines += 1
+            count(pending)
+
+    addresses = lines - sum(prefixes.values())
+    for prefix, total in prefixes.items():
+        prefixlen = int(prefix)
+        ipv6 = ipv6_prefixes[prefix]
+        if prefixlen <= 32:
+            addresses += (total - ipv6) << (32 - prefixlen)
+        if prefixlen <= 128:
+            addresses += ipv6 << (128 - prefixlen)
+    return CostEstimate(lines, addresses, size)
+
+
+def estimate_text(text: str) -> CostEstimate:
+    return estimate_chunks([text.encode('utf-8', 'replace')])
+
+
+def estimate_upload(stream: BinaryIO) -> CostEstimate:
+    """Estimate an uploaded file (gzipped or not), then rewind it for the real work."""
+    try:
+        return estimate_chunks(iter_upload_chunks(stream))
+    finally:
+        stream.seek(0)
+
+
+def client_id(remote_addr: Optional[str], real_ip: Optional[str]) -> str:
+    """Return the client address, taken from X-Real-IP when the request came through a trusted proxy."""
+    if real_ip and remote_addr:
+        try:
+            proxy = ipaddress.ip_address(remote_addr)
+        except ValueError:
+            return remote_addr
+        if any(proxy in network for network in TRUSTED_PROXIES):
+            return real_ip.strip()
+    return remote_addr or 'unknown'
+
+
+class ClientBudgets:
+    """Token buckets of input lines and bytes per client, refilled evenly over the window."""
+
+    def __init__(self, budget: int = CLIENT_BUDGET, window: int = CLIENT_WINDOW,
+                 byte_budget: int = CLIENT_BYTE_BUDGET):
+        self.budget = budget
+        self.byte_budget = byte_budget
+        self.rate = budget / window if window else float(budget)
+        self.byte_rate = byte_budget / window if window else float(byte_budget)
+        # Client -> (lines left, bytes left, when that was computed)
+        self.buckets: Dict[str, Tuple[float, float, float]] = {}
+        self.lock = threading.Lock()
+
+    def _refilled(self, client: str, now: float) -> Tuple[float, float]:
+        left, bytes_left, updated = self.buckets.get(client, (self.budget, self.byte_budget, now))
+        return (min(self.budget, left + (now - updated) * self.rate),
+                min(self.byte_budget, bytes_left + (now - updated) * self.byte_rate))
+
+    def charge(self, client: str, lines: int, size: int = 0) -> float:
+        """Take lines and bytes from the client's budget.
+
+        Returns 0 if the request is admitted, otherwise the seconds until the
+        budget has refilled enough for it (nothing is taken then).
+        """
+        lines = lines if self.budget else 0
+        size = size if self.byte_budget else 0
+        if not lines and not size:
+            return 0.0
+        now = time.monotonic()
+        with self.lock:
+            left, bytes_left = self._refilled(client, now)
+            wait = max((lines - left) / self.rate if lines > left else 0.0,
+                       (size - bytes_left) / self.byte_rate if size > bytes_left else 0.0)
+            if wait:
+                self.buckets[client] = (left, bytes_left, now)
+                return wait
+            self.buckets[client] = (left - lines, bytes_left - size, now)
+            if len(self.buckets) > CLIENT_LIMIT:
+                self._forget_full(now)
+        return 0.0
+
+    def _forget_full(self, now: float) -> None:
+        for client in list(self.buckets):
+            if self._refilled(client, now) == (self.budget, self.byte_budget):
+                del self.buckets[client]
+
+
+class Admission(NamedTuple):
+    # 'inline', 'queue', 'too_large' or 'over_budget'
+    decision: str
+    message: Optional[str] = None
+    retry_after: float = 0.0
+
+
+class AdmissionControl:
+    """Decides whether to run, queue or refuse a request from its estimated cost."""
+
+    def __init__(self, max_lines: int = MAX_LINES, max_addresses: int = MAX_ADDRESSES,
+                 inline_lines: int = INLINE_LINES, budgets: Optional[ClientBudgets] = None,
+                 max_bytes: int = MAX_BYTES):
+        self.max_lines = max_lines
+        self.max_bytes = max_bytes
+        self.max_addresses = max_addresses
+        self.inline_lines = inline_lines
+        self.budgets = budgets if budgets is not None else ClientBudgets()
+        self.decisions: Counter = Counter()
+        self.lock = threading.Lock()
+
+    def decide(self, client: str, estimate: CostEstimate, queueable: bool) -> Admission:
+        if estimate.lines > self.max_lines:
+            return Admission('too_large', f"Input too large: over {self.max_lines} lines")
+        if self.max_bytes and estimate.bytes > self.max_bytes:
+            return Admission('too_large', f"Input too large: over {self.max_bytes} bytes")
+        if self.max_addresses and estimate.addresses is not None and estimate.addresses > self.max_addresses:
+            return Admission('too_large', f"Input too large: covers over {self.max_addresses} addresses")
+        if self.budgets.budget and estimate.lines > self.budgets.budget:
+            return Admission('too_large', f"Input too large: over the budget of {self.budgets.budget} lines "
+                                          f"per client")
+        if self.budgets.byte_budget and estimate.bytes > self.budgets.byte_budget:
+            return Admission('too_large', f"Input too large: over the budget of {self.budgets.byte_budget} "
+                                          f"bytes per client")
+        retry_after = self.budgets.charge(client, estimate.lines, estimate.bytes)
+        if retry_after:
+            return Admission('over_budget', 'Too much input from this client, try again later', retry_after)
+        if queueable and estimate.lines > self.inline_lines:
+            return Admission('queue')
+        return Admission('inline')
+
+    def admit(self, route: str, client: str, estimate: CostEstimate, queueable: bool = False) -> Admission:
+        """Decide on a request and count the decision for the metrics."""
+        admission = self.decide(client, estimate, queueable)
+        with self.lock:
+            self.decisions[route, admission.decision] += 1
+        return admission
+
+    def counts(self) -> Iterable[Tuple[Tuple[str, str], int]]:
+        with self.lock:
+            return sorted(self.decisions.items())
@@ -1,345 +1,828 @@
-from flask import Flask, render_template, request, jsonify, Response, url_for
-import ipaddress
-from typing import List, Set, Union
+from flask import Blueprint, Flask, render_template, request, jsonify, Response, url_for, stream_with_context, g
+from functools import partial
+import hmac
+import json
+import math
+import os
+import shutil
+import tempfile
+import time
+from typing import BinaryIO, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union
 import traceback
 
-app = Flask(__name__, static_folder='static')
+from admission import (AdmissionControl, CostEstimate, client_id, combine_estimates,
+                       estimate_text, estimate_upload)
+from calculator import (NETWORK_FIELDS, SET_OPERATIONS, json_safe_int, calculate_subnet,
+                        subnet_summary, cached_subnet, enumeration_bounds, iter_enumeration,
+                        calculate_combined_complementary_ranges, complement_cidrs,
+                        consolidate_intervals, iter_consolidated_cidrs, set_operation, consolidate_ips,
+                        format_binary_ip, get_ip_class, cached_compact_details,
+                        calculate_network_details, cached_network_details,
+                        calculate_network_details_batch, iter_ndjson_items)
+from cidrmath import ADDRESS_BITS, parse_cidr
+from intervals import IntervalSet, ParsedCidr, parse_cidr_lines, interval_sets_from_parsed
+from jobs import Job, JobInputError, JobLimitError, JobStore
+from lookup import LIST_NAME, IntervalSetIndex, PrefixIndex, PrefixRegistry, PrefixRegistryFull
+from metrics import INPUT_SIZE, REQUEST_SECONDS, STAGE_SECONDS, registry as metrics_registry
+from planner import plan_subnets
+from profiling import ProfileStore, profiling_allowed
+from snapshots import SnapshotRegistry, iter_snapshot_chunks
+from special import SPECIAL_PURPOSE
+from uploads import LineCounter, iter_upload_lines, iter_text_lines
+
+# Routes and request hooks, attached to the Flask app by create_app()
+bp = Blueprint('ip_tools', __name__)
+
+# Background consolidation and complement jobs submitted through /api/v1/jobs
+jobs = JobStore()
+
+# Opt-in request profiles (?profile=true or X-Profile: true, for admins and allowed IPs)
+profiles = ProfileStore()
+
+# Cost-based limits on the expensive routes (413, 429, or a background job for large inputs)
+admission = AdmissionControl()
+
+# Named prefix lists for /api/v1/lookup, optionally preloaded from a directory of .txt files
+prefix_lists = PrefixRegistry()
+
+# Secret required in the X-Prefix-Lists-Token header to upload or delete prefix lists (unset: read-only)
+PREFIX_LISTS_TOKEN = os.environ.get('IP_TOOLS_PREFIX_LISTS_TOKEN', '')
+
+# Named, memory-mapped prefix set snapshots (.ipset files), shared by all workers through the page cache
+prefix_sets = SnapshotRegistry()
+
+# How long browsers and proxies may reuse a calculation result, in seconds
+CACHE_MAX_AGE = int(os.environ.get('IP_TOOLS_CACHE_MAX_AGE', 86400))
+
+# Raw request bodies (NDJSON, prefix lists) larger than this are spooled to disk before being estimated
+SPOOL_MAX_MEMORY = 1 << 20
+
+# Most subnets or host addresses streamed by one /api/v1/networks/enumerate request
+ENUMERATE_LIMIT = int(os.environ.get('IP_TOOLS_ENUMERATE_LIMIT', 1 << 20))
+
+def requested_fields(allowed: Tuple[str, ...]) -> Tuple[str, ...]:
+    """Return the fields named in ?fields= (all allowed fields if absent).
+
+    Raises ValueError for unknown field names.
+    """
+    fields = tuple(field.strip() for field in request.values.get('fields', '').split(',') if field.strip())
+    unknown = [field for field in fields if field not in allowed]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}. Available: {', '.join(allowed)}")
+    return fields or allowed
+
+# Result caches reported by /api/v1/cache and /metrics
+RESULT_CACHES = (('subnet', cached_subnet), ('network_details', cached_network_details),
+                 ('network_compact', cached_compact_details))
+
+def observe_input_size(route: str, lines: int, merged: Dict[int, IntervalSet]) -> None:
+    """Record the number of input lines, merged intervals and covered addresses of a request."""
+    INPUT_SIZE.observe(lines, route, 'lines')
+    INPUT_SIZE.observe(sum(len(merged[version]) for version in (4, 6)), route, 'intervals')
+    INPUT_SIZE.observe(sum(merged[version].num_addresses for version in (4, 6)), route, 'addresses')
+
+def collect_cache_metrics(field: str) -> Iterator[Tuple[Tuple[str, ...], int]]:
+    for name, cached in RESULT_CACHES:
+        yield (name,), getattr(cached.cache_info(), field)
+
+metrics_registry.callback('ip_tools_cache_hits_total', 'Result cache hits.', 'counter', ('cache',),
+                          lambda: collect_cache_metrics('hits'))
+metrics_registry.callback('ip_tools_cache_misses_total', 'Result cache misses.', 'counter', ('cache',),
+                          lambda: collect_cache_metrics('misses'))
+metrics_registry.callback('ip_tools_cache_entries', 'Results currently cached.', 'gauge', ('cache',),
+                          lambda: collect_cache_metrics('currsize'))
+metrics_registry.callback('ip_tools_admission_total', 'Admission decisions on estimated request costs.',
+                          'counter', ('route', 'decision'), lambda: admission.counts())
+
+@bp.before_app_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+@bp.after_app_request
+def observe_request(response: Response) -> Response:
+    # Streamed responses are timed up to their first byte
+    if 'request_start' in g:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        REQUEST_SECONDS.observe(time.perf_counter() - g.request_start,
+                                request.method, route, str(response.status_code))
+    return response
+
+def request_client() -> str:
+    """Return the client address, as told by a trusted proxy (nginx) when there is one."""
+    return client_id(request.remote_addr, request.headers.get('X-Real-IP'))
+
+def profile_access() -> bool:
+    return profiling_allowed(request_client(), request.headers.get('X-Profile-Token'))
+
+@bp.before_app_request
+def start_profile():
+    if request.args.get('profile') != 'true' and request.headers.get('X-Profile') != 'true':
+        return
+    if not profile_access():
+        return jsonify({'error': 'Profiling is not allowed for this client'}), 403
+    g.profile = profiles.start(request.method, request.full_path.rstrip('?'))
+    if g.profile is None:
+        g.profile_busy = True
+
+@bp.after_app_request
+def attach_profile(response: Response) -> Response:
+    profile = g.pop('profile', None)
+    if profile is not None:
+        response.headers['X-Profile-Id'] = profile.id
+        # Finish once the body is sent, so streamed responses are included
+        response.call_on_close(lambda: profiles.finish(profile))
+    elif g.get('profile_busy'):
+        response.headers['X-Profile-Id'] = 'busy'
+    return response
+
+@bp.teardown_app_request
+def discard_profile(error: Optional[BaseException]) -> None:
+    # Only left here when the response was never built
+    profile = g.pop('profile', None)
+    if profile is not None:
+        profiles.finish(profile)
+
+@bp.route('/api/v1/profiles', methods=['GET'])
+def list_profiles():
+    if not profile_access():
+        return jsonify({'error': 'Profiling is not allowed for this client'}), 403
+    return jsonify({'profiles': [{key: value for key, value in profile.to_dict().items() if key != 'summary'}
+                                 for profile in profiles.items()]})
+
+@bp.route('/api/v1/profiles/<profile_id>', methods=['GET'])
+def get_profile(profile_id):
+    if not profile_access():
+        return jsonify({'error': 'Profiling is not allowed for this client'}), 403
+    profile = profiles.get(profile_id)
+    if profile is None:
+        return jsonify({'error': 'Profile not found, or the request is still running'}), 404
+    if request.args.get('format') == 'text':
+        return Response(profile.summary, mimetype='text/plain')
+    return jsonify(profile.to_dict())
+
+@bp.route('/metrics', methods=['GET'])
+def metrics():
+    return Response(metrics_registry.render(), mimetype='text/plain; version=0.0.4')
+
+@bp.route('/')
+def index():
+    return render_template('index.html')
 
-# Import all functions from both original applications
-def calculate_subnet(cidr):
-    try:
-        network = ipaddress.ip_network(cidr, strict=False)
-        
-        if network.prefixlen == 32:
-            return {
-                'firstIP': str(network.network_address),
-                'lastIP': str(network.network_address),
-                'totalHosts': 1
-            }
-        elif network.prefixlen == 31:
-            return {
-                'firstIP': str(network[0]),
-                'lastIP': str(network[1]),
-                'totalHosts': 2
-            }
-        else:
-            return {
-                'firstIP': str(network[1]),
-                'lastIP': str(network[-2]),
-                'totalHosts': network.num_addresses - 2
-            }
-    except ValueError as e:
-        print(f"Subnet calculation error: {str(e)}")
+def request_text(name: str) -> str:
+    """Return a form or query field as text, joining repeated values with newlines."""
+    return '\n'.join(request.values.getlist(name))
+
+def requested_sets(name: str) -> List[Dict[int, IntervalSet]]:
+    """Return the snapshots named in a field (comma or newline separated).
+
+    Raises KeyError for unknown names.
+    """
+    names = request_text(name).replace(',', '\n').split('\n')
+    return [prefix_sets.get(set_name.strip()) for set_name in names if set_name.strip()]
+
+def with_sets(merged: Dict[int, IntervalSet], sets: List[Dict[int, IntervalSet]]) -> Dict[int, IntervalSet]:
+    """Add named snapshot sets to per-version interval sets."""
+    if not sets:
+        return merged
+    return {version: IntervalSet.union_all(version, [merged[version]] + [named[version] for named in sets])
+            for version in (4, 6)}
+
+def cacheable(response: Response) -> Response:
+    """Let browsers and proxies reuse a deterministic calculation result."""
+    response.cache_control.public = True
+    response.cache_control.max_age = CACHE_MAX_AGE
+    response.add_etag()
+    return response.make_conditional(request)
+
+def admit_request(estimate: CostEstimate, queue: Optional[Callable[[], Job]] = None):
+    """Apply admission control to the current request before doing its work.
+
+    Returns None when the request may run inline, otherwise the response to
+    send instead: 413 or 429 with the estimate, or 202 with the job that
+    queue() submitted for a large input.
+    """
+    decision = admission.admit(request.url_rule.rule, request_client(), estimate, queue is not None)
+    if decision.decision == 'inline':
         return None
-
-def get_all_networks(cidrs: List[str]) -> Set[ipaddress.IPv4Network]:
-    networks = set()
-    for cidr in cidrs:
+    if decision.decision == 'queue':
         try:
-            network = ipaddress.ip_network(cidr.strip(), strict=False)
-            networks.add(network)
-        except ValueError as e:
-            print(f"Error parsing CIDR {cidr}: {str(e)}")
-    return networks
-
-def calculate_combined_complementary_ranges(cidrs: List[str]) -> List[str]:
-    try:
-        if not cidrs:
-            return []
-
-        # Convert CIDR strings to network objects
-        networks = get_all_networks(cidrs)
-        if not networks:
-            return []
-
-        # Convert networks to integer ranges for easier manipulation
-        covered_ranges = [(int(network.network_address), int(network.broadcast_address))
-                         for network in networks]
-        covered_ranges.sort()
-
-        # Combine overlapping ranges into continuous blocks
-        merged_ranges = []
-        current_start, current_end = covered_ranges[0]
-        
-        for start, end in covered_ranges[1:]:
-            if start <= current_end + 1:
-                current_end = max(current_end, end)
-            else:
-                merged_ranges.append((current_start, current_end))
-                current_start, current_end = start, end
-        merged_ranges.append((current_start, current_end))
-
-        # Find gaps between the merged ranges - these are the complementary ranges
-        complementary = []
-        current_ip = 0
-        
-        for start, end in merged_ranges:
-            if current_ip < start:
-                # Convert the gap to CIDR notation
-                range_networks = ipaddress.summarize_address_range(
-                    ipaddress.IPv4Address(current_ip),
-                    ipaddress.IPv4Address(start - 1)
-                )
-                complementary.extend([str(net) for net in range_networks])
-            current_ip = end + 1
-
-        # Handle any remaining range after the last merged range
-        if current_ip < int(ipaddress.IPv4Address('255.255.255.255')):
-            range_networks = ipaddress.summarize_address_range(
-                ipaddress.IPv4Address(current_ip),
-                ipaddress.IPv4Address('255.255.255.255')
-            )
-            complementary.extend([str(net) for net in range_networks])
+            return job_response(queue(), 202)
+        except JobLimitError as e:
+            return jsonify({'error': str(e), 'estimate': estimate.to_dict()}), 503
+
+    response = jsonify({'error': decision.message, 'estimate': estimate.to_dict()})
+    if decision.decision == 'over_budget':
+        response.status_code = 429
+        response.headers['Retry-After'] = str(math.ceil(decision.retry_after))
+    else:
+        response.status_code = 413
+    return response
 
-        return complementary
+def spooled_body() -> BinaryIO:
+    """Copy the raw request body to a temporary file, so it can be estimated and then read again."""
+    body = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY)
+    shutil.copyfileobj(request.stream, body)
+    body.seek(0)
+    return body
 
-    except Exception as e:
-        print(f"Error calculating complementary ranges: {str(e)}")
-        return []
+# Parts of the compact /calculate-complement layouts, and the columns of a subnet row
+COMPLEMENT_FIELDS = ('subnets', 'complementary')
+SUBNET_FIELDS = ('cidr', 'firstIP', 'lastIP', 'totalHosts')
 
-def consolidate_ips(ip_list: List[str]) -> List[str]:
-    """Consolidate IP addresses and CIDR ranges into the most efficient CIDR representation."""
+@bp.route('/calculate-complement', methods=['GET', 'POST'])
+def calculate_complement():
+    text = request_text('cidr')
+    universe_text = request_text('universe')
     try:
-        # Convert IPs and CIDRs to integers and remove duplicates
-        ip_integers = set()
-        for item in ip_list:
-            try:
-                # Try to parse as CIDR first
-                if '/' in item:
-                    network = ipaddress.ip_network(item.strip(), strict=False)
-                    # Add all IPs in the network
-                    for ip in network:
-                        ip_integers.add(int(ip))
-                else:
-                    # Parse as individual IP
-                    ip = ipaddress.ip_address(item.strip())
-                    ip_integers.add(int(ip))
-            except ValueError:
-                continue
-
-        if not ip_integers:
-            return []
-
-        # Sort the IP integers
-        sorted_ips = sorted(list(ip_integers))
-        
-        # Consolidate ranges
-        consolidated = []
-        current_start = sorted_ips[0]
-        current_end = sorted_ips[0]
-
-        for ip in sorted_ips[1:]:
-            if ip == current_end + 1:
-                # Consecutive IP, extend the current range
-                current_end = ip
-            else:
-                # Gap found, add previous range or individual IP
-                consolidated.append((current_start, current_end))
-                current_start = current_end = ip
-
-        # Add the last range or IP
-        consolidated.append((current_start, current_end))
-
-        # Convert ranges to CIDR notation
-        cidr_ranges = []
-        for start, end in consolidated:
-            start_ip = ipaddress.ip_address(start)
-            end_ip = ipaddress.ip_address(end)
-            
-            # Try to create the most compact CIDR representation
-            try:
-                range_networks = ipaddress.summarize_address_range(start_ip, end_ip)
-                cidr_ranges.extend(str(network) for network in range_networks)
-            except Exception:
-                # Fallback to individual IPs if summarization fails
-                cidr_ranges.append(f"{start_ip}/32")
-
-        return cidr_ranges
-
-    except Exception:
-        return []
-
-def format_binary_ip(ip: int) -> str:
-    """Format IP address in binary with dots between octets."""
-    binary = format(ip, '032b')
-    return f"{binary[:8]}.{binary[8:16]}.{binary[16:24]}.{binary[24:]}"
-
-def get_ip_class(ip: ipaddress.IPv4Address) -> str:
-    """Determine IP address class and type."""
-    first_octet = int(ip) >> 24
-    if first_octet >= 240:
-        ip_class = 'E'
-    elif first_octet >= 224:
-        ip_class = 'D'
-    elif first_octet >= 192:
-        ip_class = 'C'
-    elif first_octet >= 128:
-        ip_class = 'B'
-    else:
-        ip_class = 'A'
+        sets = requested_sets('sets')
+        universe_sets = requested_sets('universe_sets')
+    except KeyError as e:
+        return jsonify({'error': e.args[0]}), 404
+    layout = request.values.get('format', 'compact' if 'fields' in request.values else 'full')
+
+    # Jobs return the full layout and take no snapshots, other large requests run inline
+    queue = None
+    if layout == 'full' and not sets and not universe_sets:
+        queue = partial(jobs.submit, 'complement', complement_text_job, text, universe_text)
+    refused = admit_request(combine_estimates(estimate_text(text), estimate_text(universe_text)), queue)
+    if refused is not None:
+        return refused
+
+    # Parse every line once, the result feeds both the subnet summary and the complement
+    with STAGE_SECONDS.time('complement', 'parse'):
+        parsed, errors = parse_cidr_lines(text.split('\n'))
     
-    # Check if private
-    if ip.is_private:
-        return f"Class {ip_class}, Private Internet"
-    return f"Class {ip_class}, Public Internet"
+    if not parsed and not errors and not sets:
+        return jsonify({'error': 'At least one CIDR notation required'}), 400
+    if errors:
+        return jsonify({
+            'error': f"Invalid CIDR notation: {errors[0]['cidr']}",
+            'errors': errors
+        }), 400
 
-def calculate_network_details(cidr: str) -> dict:
-    """Calculate detailed network information similar to ipcalc."""
+    universe, universe_errors = parse_cidr_lines(universe_text.split('\n'))
+    if universe_errors:
+        return jsonify({
+            'error': f"Invalid universe prefix: {universe_errors[0]['cidr']}",
+            'errors': universe_errors
+        }), 400
+    
+    if layout not in ('full', 'compact', 'array'):
+        return jsonify({'error': 'format must be full, compact or array'}), 400
     try:
-        # Determine if input is a single IP or a network
-        if '/' in cidr:
-            network = ipaddress.ip_network(cidr, strict=False)
-            input_ip = ipaddress.ip_address(cidr.split('/')[0].strip())
-        else:
-            # Single IP, treat as /32 network
-            network = ipaddress.ip_network(f"{cidr.strip()}/32", strict=False)
-            input_ip = ipaddress.ip_address(cidr.strip())
-        netmask = network.netmask
-        wildcard = network.hostmask
-        
-        # For /31 networks (point-to-point)
-        if network.prefixlen == 31:
-            hostmin = network[0]
-            hostmax = network[1]
-            hosts = 2
-        # For /32 networks (single host)
-        elif network.prefixlen == 32:
-            hostmin = hostmax = network.network_address
-            hosts = 1
-        # For normal networks
-        else:
-            hostmin = network[1]
-            hostmax = network[-2]
-            hosts = network.num_addresses - 2
-
-        return {
-            'success': True,
-            'details': {
-                'address': {
-                    'ip': str(input_ip),
-                    'binary': format_binary_ip(int(input_ip))
-                },
-                'netmask': {
-                    'ip': str(netmask),
-                    'binary': format_binary_ip(int(netmask)),
-                    'cidr': network.prefixlen
-                },
-                'wildcard': {
-                    'ip': str(wildcard),
-                    'binary': format_binary_ip(int(wildcard))
-                },
-                'network': {
-                    'ip': str(network.network_address),
-                    'binary': format_binary_ip(int(network.network_address))
-                },
-                'hostmin': {
-                    'ip': str(hostmin),
-                    'binary': format_binary_ip(int(hostmin))
-                },
-                'hostmax': {
-                    'ip': str(hostmax),
-                    'binary': format_binary_ip(int(hostmax))
-                },
-                'broadcast': {
-                    'ip': str(network.broadcast_address),
-                    'binary': format_binary_ip(int(network.broadcast_address))
-                },
-                'hosts': hosts,
-                'class': get_ip_class(input_ip)
-            }
-        }
+        fields = requested_fields(COMPLEMENT_FIELDS)
     except ValueError as e:
-        return {
-            'success': False,
-            'error': str(e)
-        }
-
-@app.route('/')
-def index():
-    return render_template('index.html')
+        return jsonify({'error': str(e)}), 400
 
-@app.route('/calculate-complement', methods=['POST'])
-def calculate_complement():
-    cidrs = request.form.get('cidr', '').split('\n')
-    cidrs = [cidr.strip() for cidr in cidrs if cidr.strip()]
-    
-    if not cidrs:
-        return jsonify({'error': 'At least one CIDR notation required'}), 400
-    
     try:
-        subnets = []
-        for cidr in cidrs:
-            subnet_info = calculate_subnet(cidr)
-            if subnet_info is None:
-                return jsonify({'error': f'Invalid CIDR notation: {cidr}'}), 400
-            subnets.append({'cidr': cidr, **subnet_info})
-        
-        complementary = calculate_combined_complementary_ranges(cidrs)
-        
-        return jsonify({
-            'subnets': subnets,
-            'complementary': [{'cidr': cidr} for cidr in complementary]
-        })
+        with STAGE_SECONDS.time('complement', 'subnets'):
+            subnets = [{'cidr': entry.text, **subnet_summary(entry.version, entry.address, entry.prefixlen)}
+                       for entry in parsed] if 'subnets' in fields else []
+
+        with STAGE_SECONDS.time('complement', 'merge'):
+            covered = with_sets(interval_sets_from_parsed(parsed), sets)
+            bounds = with_sets(interval_sets_from_parsed(universe), universe_sets)
+        with STAGE_SECONDS.time('complement', 'summarize'):
+            complementary = complement_cidrs(covered, bounds) if 'complementary' in fields else []
+        observe_input_size('complement', len(parsed), covered)
+
+        with STAGE_SECONDS.time('complement', 'serialize'):
+            if layout == 'full':
+                return cacheable(jsonify({
+                    'subnets': subnets,
+                    'complementary': [{'cidr': cidr} for cidr in complementary]
+                }))
+            # Compact layouts list the complement as plain strings and leave out unrequested parts
+            result = {}
+            if 'subnets' in fields:
+                result['subnets'] = subnets
+                if layout == 'array':
+                    result['subnet_fields'] = SUBNET_FIELDS
+                    result['subnets'] = [[subnet[field] for field in SUBNET_FIELDS] for subnet in subnets]
+            if 'complementary' in fields:
+                result['complementary'] = complementary
+            return cacheable(jsonify(result))
     except Exception as e:
         print(f"Calculation error: {str(e)}")
         return jsonify({'error': 'An error occurred during calculation'}), 500
 
-@app.route('/consolidate', methods=['POST'])
+@bp.route('/consolidate', methods=['POST'])
 def consolidate():
     try:
-        ip_list = []
-        
         # Handle manual input
         if 'ip-list' in request.form:
             content = request.form['ip-list']
-            ip_list = [line.strip() for line in content.splitlines() if line.strip()]
+            ip_lines = LineCounter(line.strip() for line in content.splitlines() if line.strip())
+            estimate = estimate_text(content)
+            queue = partial(jobs.submit, 'consolidate', consolidate_job, ip_lines.lines, None)
         
-        # Handle file upload
+        # Handle file upload, read as a stream so large (or gzipped) files never sit in memory
         elif 'file' in request.files:
             file = request.files['file']
             if file.filename == '':
                 return jsonify({'error': 'No file selected'}), 400
-            content = file.read().decode('utf-8')
-            ip_list = [line.strip() for line in content.splitlines() if line.strip()]
+            ip_lines = LineCounter(iter_upload_lines(file.stream))
+            estimate = estimate_upload(file.stream)
+            queue = partial(submit_upload_job, file)
         
+        # Only named prefix sets
+        elif request.form.get('sets'):
+            ip_lines = LineCounter([])
+            estimate = CostEstimate(0, 0)
+            queue = None
+
         else:
             return jsonify({'error': 'No input provided'}), 400
 
-        if not ip_list:
+        try:
+            sets = requested_sets('sets')
+        except KeyError as e:
+            return jsonify({'error': e.args[0]}), 404
+
+        # Jobs take no snapshots and do not export them, other large requests run inline
+        if sets or request.form.get('format') == 'snapshot':
+            queue = None
+        refused = admit_request(estimate, queue)
+        if refused is not None:
+            return refused
+
+        with STAGE_SECONDS.time('consolidate', 'parse'):
+            merged = with_sets(consolidate_intervals(ip_lines), sets)
+        observe_input_size('consolidate', ip_lines.count, merged)
+
+        if not ip_lines.count and not sets:
             return jsonify({'error': 'No valid IP addresses found in file'}), 400
 
-        ranges = consolidate_ips(ip_list)
+        # Binary snapshot export, loadable later through IP_TOOLS_SNAPSHOT_DIR
+        if request.form.get('format') == 'snapshot':
+            return Response(
+                iter_snapshot_chunks(merged),
+                mimetype='application/octet-stream',
+                headers={'Content-Disposition': 'attachment; filename=consolidated.ipset'}
+            )
+
+        if request.form.get('download') == 'true':
+            return Response(
+                iter_text_lines(iter_consolidated_cidrs(merged)),
+                mimetype='text/plain',
+                headers={'Content-Disposition': 'attachment; filename=consolidated_ranges.txt'}
+            )
+
+        with STAGE_SECONDS.time('consolidate', 'summarize'):
+            ranges = list(iter_consolidated_cidrs(merged))
         
         response_data = {
-            'original_count': len(ip_list),
+            'original_count': ip_lines.count,
             'ranges': ranges,
             'ranges_count': len(ranges)
         }
+        
+        with STAGE_SECONDS.time('consolidate', 'serialize'):
+            return jsonify(response_data)
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def request_set_input(name: str) -> Tuple[Optional[LineCounter], List[Dict[int, IntervalSet]], CostEstimate]:
+    """Return the lines of a text field or file upload, the named snapshots and the input cost, for one operand.
+
+    Raises KeyError for unknown snapshot names.
+    """
+    sets = requested_sets(f'{name}_sets')
+    if request.form.get(name, '').strip():
+        content = request.form[name]
+        return (LineCounter(line.strip() for line in content.splitlines() if line.strip()), sets,
+                estimate_text(content))
+    if f'{name}_file' in request.files and request.files[f'{name}_file'].filename:
+        stream = request.files[f'{name}_file'].stream
+        return LineCounter(iter_upload_lines(stream)), sets, estimate_upload(stream)
+    return (LineCounter([]) if sets else None), sets, CostEstimate(0, 0)
+
+@bp.route('/set-operation', methods=['POST'])
+def calculate_set_operation():
+    operation = request.form.get('operation', '')
+    if operation not in SET_OPERATIONS:
+        return jsonify({'error': f"Operation must be one of: {', '.join(SET_OPERATIONS)}"}), 400
+
+    try:
+        first_lines, first_sets, first_estimate = request_set_input('a')
+        second_lines, second_sets, second_estimate = request_set_input('b')
+    except KeyError as e:
+        return jsonify({'error': e.args[0]}), 404
+    if first_lines is None or second_lines is None:
+        return jsonify({'error': 'Both list A and list B are required'}), 400
+    refused = admit_request(combine_estimates(first_estimate, second_estimate))
+    if refused is not None:
+        return refused
+
+    try:
+        first = with_sets(consolidate_intervals(first_lines), first_sets)
+        second = with_sets(consolidate_intervals(second_lines), second_sets)
+        result = set_operation(operation, first, second)
 
         if request.form.get('download') == 'true':
-            output = '\n'.join(ranges)
             return Response(
-                output,
+                iter_text_lines(iter_consolidated_cidrs(result)),
                 mimetype='text/plain',
-                headers={'Content-Disposition': 'attachment; filename=consolidated_ranges.txt'}
+                headers={'Content-Disposition': f'attachment; filename={operation}.txt'}
             )
-        
-        return jsonify(response_data)
+
+        ranges = list(iter_consolidated_cidrs(result))
+        return jsonify({
+            'operation': operation,
+            'a_count': first_lines.count,
+            'b_count': second_lines.count,
+            'ranges': ranges,
+            'ranges_count': len(ranges)
+        })
 
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/calculate-network', methods=['POST'])
+@bp.route('/calculate-network', methods=['GET', 'POST'])
 def calculate_network():
-    cidr = request.form.get('cidr', '').strip()
+    cidr = request.values.get('cidr', '').strip()
     if not cidr:
         return jsonify({'error': 'CIDR notation required'}), 400
     
+    # Machine clients can ask for a flat object or array with only the fields they need
+    layout = request.values.get('format', 'compact' if 'fields' in request.values else 'full')
+    if layout != 'full':
+        if layout not in ('compact', 'array'):
+            return jsonify({'error': 'format must be full, compact or array'}), 400
+        try:
+            fields = requested_fields(NETWORK_FIELDS)
+            version, input_ip, prefixlen = parse_cidr(cidr)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        values = cached_compact_details(version, input_ip, prefixlen, fields)
+        if layout == 'array':
+            return cacheable(jsonify({'fields': fields, 'values': values}))
+        return cacheable(jsonify(dict(zip(fields, values))))
+
     result = calculate_network_details(cidr)
     if not result['success']:
         return jsonify({'error': result['error']}), 400
         
-    return jsonify(result['details'])
+    return cacheable(jsonify(result['details']))
+
+@bp.route('/api/v1/networks/details', methods=['POST'])
+def network_details_batch():
+    include_binary = request.args.get('binary', 'true').lower() != 'false'
+
+    # NDJSON requests are answered with NDJSON, one result line per input line
+    if request.mimetype == 'application/x-ndjson':
+        body = spooled_body()
+        refused = admit_request(estimate_upload(body))
+        if refused is not None:
+            body.close()
+            return refused
+        results = calculate_network_details_batch(
+            iter_ndjson_items(iter_upload_lines(body)), include_binary)
+        return Response(
+            stream_with_context(json.dumps(result) + '\n' for result in results),
+            mimetype='application/x-ndjson'
+        )
+
+    payload = request.get_json(silent=True)
+    if isinstance(payload, dict):
+        cidrs = payload.get('cidrs')
+        include_binary = payload.get('binary', include_binary)
+        if not isinstance(include_binary, bool):
+            return jsonify({'error': 'binary must be true or false'}), 400
+    else:
+        cidrs = payload
+    if not isinstance(cidrs, list):
+        return jsonify({'error': 'A JSON array of CIDR notations is required'}), 400
+    refused = admit_request(CostEstimate(len(cidrs)))
+    if refused is not None:
+        return refused
+
+    results = list(calculate_network_details_batch(cidrs, include_binary))
+    return jsonify({
+        'results': results,
+        'count': len(results)
+    })
+
+@bp.route('/api/v1/plan', methods=['POST'])
+def plan_network():
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict) or not isinstance(payload.get('parent'), str):
+        return jsonify({'error': 'A JSON object with a parent CIDR is required'}), 400
+    requests = payload.get('requests')
+    allocated = payload.get('allocated', [])
+    if not isinstance(requests, list) or not isinstance(allocated, list):
+        return jsonify({'error': 'requests and allocated must be JSON arrays'}), 400
+    refused = admit_request(CostEstimate(len(requests) + len(allocated)))
+    if refused is not None:
+        return refused
+
+    try:
+        plan = plan_subnets(payload['parent'], requests, allocated)
+    except (ValueError, AttributeError) as e:
+        return jsonify({'error': str(e)}), 400
+    plan['free_addresses'] = json_safe_int(plan['free_addresses'])
+    return jsonify(plan)
+
+@bp.route('/api/v1/networks/enumerate', methods=['GET'])
+def enumerate_network():
+    try:
+        version, address, prefixlen = parse_cidr(request.args.get('cidr', ''))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    mode = request.args.get('mode', 'subnets' if 'prefixlen' in request.args else 'hosts')
+    output = request.args.get('format', 'text')
+    if mode not in ('subnets', 'hosts') or output not in ('text', 'ndjson'):
+        return jsonify({'error': 'mode must be subnets or hosts, format must be text or ndjson'}), 400
+
+    try:
+        new_prefixlen = int(request.args['prefixlen'].lstrip('/')) if mode == 'subnets' else None
+        offset = int(request.args.get('offset', 0))
+        limit = int(request.args.get('limit', ENUMERATE_LIMIT))
+    except (KeyError, ValueError):
+        return jsonify({'error': 'Subnets need a prefixlen, offset and limit must be integers'}), 400
+    if new_prefixlen is not None and not prefixlen <= new_prefixlen <= ADDRESS_BITS[version]:
+        return jsonify({'error': f"prefixlen must be between {prefixlen} and {ADDRESS_BITS[version]}"}), 400
+    if offset < 0 or limit < 1:
+        return jsonify({'error': 'offset cannot be negative and limit must be at least 1'}), 400
+
+    # Each page is computed from its offset, so page N costs as much as the first one
+    first, step, total = enumeration_bounds(version, address, prefixlen, new_prefixlen)
+    start = min(offset, total)
+    stop = min(total, start + min(limit, ENUMERATE_LIMIT))
+    items = iter_enumeration(version, first, step, start, stop, new_prefixlen)
+
+    headers = {'X-Total-Count': str(total)}
+    if start < stop < total:
+        args = dict(request.args.items(), offset=stop, limit=stop - start)
+        headers['Link'] = f'<{url_for(".enumerate_network", **args)}>; rel="next"'
+
+    if output == 'ndjson':
+        key = 'ip' if new_prefixlen is None else 'cidr'
+        lines = (json.dumps({'index': index, key: item}) + '\n' for index, item in enumerate(items, start))
+        return Response(lines, mimetype='application/x-ndjson', headers=headers)
+    return Response(iter_text_lines(items), mimetype='text/plain', headers=headers)
+
+@bp.route('/api/v1/cache', methods=['GET'])
+def cache_stats():
+    stats = {}
+    for name, cached in RESULT_CACHES:
+        info = cached.cache_info()
+        stats[name] = {
+            'hits': info.hits,
+            'misses': info.misses,
+            'size': info.currsize,
+            'maxsize': info.maxsize
+        }
+    return jsonify(stats)
+
+def consolidate_job(job: Job, ip_lines: Optional[Iterable[str]], upload_path: Optional[str]) -> dict:
+    """Consolidate manual input lines or an uploaded file in the background."""
+    try:
+        job.stage = 'parsing'
+        if upload_path is not None:
+            with open(upload_path, 'rb') as upload:
+                lines = LineCounter(job.track(iter_upload_lines(upload)))
+                merged = consolidate_intervals(lines)
+        else:
+            lines = LineCounter(job.track(ip_lines))
+            merged = consolidate_intervals(lines)
+    finally:
+        if upload_path is not None:
+            os.remove(upload_path)
+
+    job.progress['intervals_merged'] = sum(len(merged[version]) for version in (4, 6))
+    job.stage = 'summarizing'
+    ranges = list(iter_consolidated_cidrs(merged))
+    return {
+        'original_count': lines.count,
+        'ranges': ranges,
+        'ranges_count': len(ranges)
+    }
+
+def complement_job(job: Job, parsed: List[ParsedCidr], universe: List[ParsedCidr]) -> dict:
+    """Calculate the subnet summary and the complement of parsed lines in the background."""
+    job.progress['lines_parsed'] = len(parsed)
+    job.stage = 'summarizing'
+    subnets = [{'cidr': entry.text, **subnet_summary(entry.version, entry.address, entry.prefixlen)}
+               for entry in parsed]
+
+    job.stage = 'merging'
+    covered = interval_sets_from_parsed(parsed)
+    job.progress['intervals_merged'] = sum(len(covered[version]) for version in (4, 6))
+
+    job.stage = 'complementing'
+    complementary = complement_cidrs(covered, interval_sets_from_parsed(universe))
+    return {
+        'subnets': subnets,
+        'complementary': [{'cidr': cidr} for cidr in complementary]
+    }
+
+def complement_text_job(job: Job, text: str, universe_text: str) -> dict:
+    """Parse and complement an input that was too large to handle inline."""
+    job.stage = 'parsing'
+    parsed, errors = parse_cidr_lines(job.track(text.split('\n')))
+    universe, universe_errors = parse_cidr_lines(universe_text.split('\n'))
+    if errors:
+        raise JobInputError(f"Invalid CIDR notation: {errors[0]['cidr']}", errors)
+    if universe_errors:
+        raise JobInputError(f"Invalid universe prefix: {universe_errors[0]['cidr']}", universe_errors)
+    return complement_job(job, parsed, universe)
+
+def submit_upload_job(file) -> Job:
+    """Queue the consolidation of an uploaded file."""
+    # The upload is gone once this request ends, keep a copy for the job
+    with tempfile.NamedTemporaryFile(prefix='ip-tools-', delete=False) as upload:
+        file.save(upload)
+    try:
+        return jobs.submit('consolidate', consolidate_job, None, upload.name)
+    except JobLimitError:
+        os.remove(upload.name)
+        raise
+
+def job_response(job: Job, status: int = 200):
+    return jsonify({
+        **job.to_dict(),
+        'status_url': url_for('.job_status', job_id=job.id),
+        'result_url': url_for('.job_result', job_id=job.id)
+    }), status
+
+@bp.route('/api/v1/jobs', methods=['POST'])
+def submit_job():
+    kind = request.form.get('type', '')
+    try:
+        if kind == 'consolidate':
+            if 'ip-list' in request.form:
+                content = request.form['ip-list']
+                refused = admit_request(estimate_text(content))
+                if refused is not None:
+                    return refused
+                ip_lines = [line.strip() for line in content.splitlines() if line.strip()]
+                job = jobs.submit(kind, consolidate_job, ip_lines, None)
+            elif 'file' in request.files and request.files['file'].filename:
+                refused = admit_request(estimate_upload(request.files['file'].stream))
+                if refused is not None:
+                    return refused
+                job = submit_upload_job(request.files['file'])
+            else:
+                return jsonify({'error': 'No input provided'}), 400
+
+        elif kind == 'complement':
+            text = request_text('cidr')
+            if not text.strip():
+                return jsonify({'error': 'At least one CIDR notation required'}), 400
+            universe_text = request_text('universe')
+            refused = admit_request(combine_estimates(estimate_text(text), estimate_text(universe_text)))
+            if refused is not None:
+                return refused
+            # Parsing is part of the job, invalid lines make it fail
+            job = jobs.submit(kind, complement_text_job, text, universe_text)
+
+        else:
+            return jsonify({'error': "Job type must be 'consolidate' or 'complement'"}), 400
+
+    except JobLimitError as e:
+        return jsonify({'error': str(e)}), 503
+
+    return job_response(job, 202)
+
+@bp.route('/api/v1/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found or expired'}), 404
+    return job_response(job)
+
+@bp.route('/api/v1/jobs/<job_id>/result', methods=['GET'])
+def job_result(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found or expired'}), 404
+    if job.status == 'failed':
+        # Invalid input is the client's mistake, reported like the synchronous routes do
+        if job.errors is not None:
+            return jsonify({'error': job.error, 'errors': job.errors}), 400
+        return jsonify({'error': job.error}), 500
+    if not job.done:
+        return jsonify({'error': 'Job has not finished yet', 'status': job.status}), 409
+
+    if job.kind == 'consolidate' and request.args.get('download') == 'true':
+        return Response(
+            iter_text_lines(job.result['ranges']),
+            mimetype='text/plain',
+            headers={'Content-Disposition': 'attachment; filename=consolidated_ranges.txt'}
+        )
+    return jsonify(job.result)
+
+@bp.route('/api/v1/prefix-lists', methods=['GET'])
+def list_prefix_lists():
+    return jsonify({name: index.stats() for name, index in prefix_lists.items()})
+
+def prefix_list_access() -> bool:
+    token = request.headers.get('X-Prefix-Lists-Token')
+    return bool(PREFIX_LISTS_TOKEN and token) and hmac.compare_digest(token.encode(), PREFIX_LISTS_TOKEN.encode())
+
+@bp.route('/api/v1/prefix-lists/<name>', methods=['PUT', 'DELETE'])
+def manage_prefix_list(name):
+    if not prefix_list_access():
+        return jsonify({'error': 'Changing prefix lists requires a valid X-Prefix-Lists-Token'}), 403
+    if request.method == 'DELETE':
+        if not prefix_lists.remove(name):
+            return jsonify({'error': 'Prefix list not found'}), 404
+        return '', 204
+    if not LIST_NAME.match(name):
+        return jsonify({'error': f'Invalid prefix list name: {name}'}), 400
+
+    # The list is sent as a form field, an uploaded file or the raw (optionally gzipped) body
+    if 'prefixes' in request.form:
+        estimate = estimate_text(request.form['prefixes'])
+        lines = (line.strip() for line in request.form['prefixes'].splitlines() if line.strip())
+    elif 'file' in request.files:
+        estimate = estimate_upload(request.files['file'].stream)
+        lines = iter_upload_lines(request.files['file'].stream)
+    else:
+        body = spooled_body()
+        estimate = estimate_upload(body)
+        lines = iter_upload_lines(body)
+    refused = admit_request(estimate)
+    if refused is not None:
+        return refused
+
+    index = PrefixIndex(lines)
+    if not len(index):
+        return jsonify({'error': 'No valid prefixes found'}), 400
+    try:
+        prefix_lists.put(name, index)
+    except PrefixRegistryFull as e:
+        return jsonify({'error': str(e)}), 507
+    return jsonify({'name': name, **index.stats()})
+
+@bp.route('/api/v1/prefix-sets', methods=['GET'])
+def list_prefix_sets():
+    return jsonify({name: {'ipv4_intervals': len(sets[4]), 'ipv6_intervals': len(sets[6])}
+                    for name, sets in prefix_sets.items()})
+
+@bp.route('/api/v1/lookup', methods=['POST'])
+def lookup_prefixes():
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict) or not isinstance(payload.get('ips'), list):
+        return jsonify({'error': 'Expected {"list": name, "ips": [...]}'}), 400
+
+    # Prefix lists give the most specific prefix, snapshots the consolidated block
+    name = str(payload.get('list', ''))
+    index = prefix_lists.get(name)
+    if index is None:
+        try:
+            index = IntervalSetIndex(prefix_sets.get(name))
+        except KeyError:
+            return jsonify({'error': 'Prefix list not found'}), 404
+
+    refused = admit_request(CostEstimate(len(payload['ips'])))
+    if refused is not None:
+        return refused
+
+    results = []
+    for ip, prefix, error in index.lookup_many(payload['ips']):
+        results.append({'ip': ip, 'prefix': prefix} if error is None else {'ip': ip, 'error': error})
+    return jsonify({
+        'results': results,
+        'count': len(results)
+    })
+
+@bp.route('/api/v1/classify', methods=['POST'])
+def classify_ips():
+    payload = request.get_json(silent=True)
+    ips = payload.get('ips') if isinstance(payload, dict) else payload
+    if not isinstance(ips, list):
+        return jsonify({'error': 'A JSON array of IP addresses is required'}), 400
+    refused = admit_request(CostEstimate(len(ips)))
+    if refused is not None:
+        return refused
+
+    results = SPECIAL_PURPOSE.classify_many(ips)
+    return jsonify({
+        'results': results,
+        'count': len(results)
+    })
+
+def create_app() -> Flask:
+    """Build the Flask app and load the shared, read-only data.
+
+    Under gunicorn --preload this runs once in the master process, so every
+    worker starts with the prefix lists, snapshots and compiled template
+    already in memory and shares them copy-on-write. Pools and job threads
+    are only started on first use, after the fork.
+    """
+    app = Flask(__name__, static_folder='static')
+    app.register_blueprint(bp)
+
+    if os.environ.get('IP_TOOLS_PREFIX_LISTS_DIR'):
+        prefix_lists.load_directory(os.environ['IP_TOOLS_PREFIX_LISTS_DIR'])
+    if os.environ.get('IP_TOOLS_SNAPSHOT_DIR'):
+        prefix_sets.load_directory(os.environ['IP_TOOLS_SNAPSHOT_DIR'])
+    app.jinja_env.get_template('index.html')
+    return app
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, debug=True)
+    create_app().run(host='0.0.0.0', port=5000, debug=True)
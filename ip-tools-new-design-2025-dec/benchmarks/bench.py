@@ -0,0 +1,255 @@
+"""Benchmarks for the IP Tools calculation functions and HTTP routes.
+
+Every case runs on a synthetic, seeded dataset so runs are comparable between
+commits. Results (throughput, latency percentiles, peak memory) are written as
+JSON, and a previous result file can be passed with --compare.
+
+    python benchmarks/bench.py --output before.json
+    python benchmarks/bench.py --compare before.json --output after.json
+"""
+import argparse
+import gc
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, List, NamedTuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as ip_tools  # noqa: E402
+from admission import AdmissionControl, ClientBudgets  # noqa: E402
+
+
+def format_ipv4(value: int) -> str:
+    return f"{value >> 24}.{(value >> 16) & 255}.{(value >> 8) & 255}.{value & 255}"
+
+
+def sparse_single_ips(count: int, rng: random.Random) -> List[str]:
+    """Scattered single IPv4 addresses, almost nothing merges."""
+    return [format_ipv4(rng.randrange(1 << 24, 224 << 24)) for _ in range(count)]
+
+
+def dense_adjacent_24s(count: int, rng: random.Random) -> List[str]:
+    """Consecutive /24 networks in shuffled order, everything merges."""
+    lines = [f"{format_ipv4((10 << 24) + (index << 8))}/24" for index in range(count)]
+    rng.shuffle(lines)
+    return lines
+
+
+def overlapping_supernets(count: int, rng: random.Random) -> List[str]:
+    """Large networks (/8 to /16) that overlap and nest inside each other."""
+    lines = []
+    for _ in range(count):
+        prefixlen = rng.randrange(8, 17)
+        network = rng.randrange(1 << 32) >> (32 - prefixlen) << (32 - prefixlen)
+        lines.append(f"{format_ipv4(network)}/{prefixlen}")
+    return lines
+
+
+def mixed_v4_v6(count: int, rng: random.Random) -> List[str]:
+    """Half IPv4 /24s, half IPv6 /48s and /64s under 2001:db8::/32."""
+    lines = []
+    for index in range(count):
+        if index % 2:
+            lines.append(f"{format_ipv4(rng.randrange(1 << 24, 224 << 24) >> 8 << 8)}/24")
+        else:
+            prefixlen = rng.choice((48, 64))
+            groups = [0x2001, 0xdb8] + [rng.randrange(1 << 16) for _ in range(prefixlen // 16 - 2)]
+            lines.append(':'.join(f"{group:x}" for group in groups) + f"::/{prefixlen}")
+    return lines
+
+
+DATASETS = {
+    'sparse': sparse_single_ips,
+    'dense': dense_adjacent_24s,
+    'supernets': overlapping_supernets,
+    'mixed': mixed_v4_v6,
+}
+
+
+class Case(NamedTuple):
+    name: str
+    items: int
+    repeat: int
+    run: Callable[[], object]
+
+
+def clear_caches() -> None:
+    ip_tools.cached_subnet.cache_clear()
+    ip_tools.cached_network_details.cache_clear()
+    ip_tools.cached_compact_details.cache_clear()
+
+
+def build_cases(scale: float, seed: int) -> List[Case]:
+    # Measure the calculations themselves, without size limits, client budgets or background jobs
+    ip_tools.admission = AdmissionControl(max_lines=sys.maxsize, inline_lines=sys.maxsize, max_bytes=0,
+                                          budgets=ClientBudgets(budget=0, byte_budget=0))
+    client = ip_tools.create_app().test_client()
+    cases = []
+
+    def size(count: int) -> int:
+        return max(1, int(count * scale))
+
+    for dataset, generate in DATASETS.items():
+        lines = generate(size(100_000), random.Random(seed))
+        text = '\n'.join(lines)
+        cases.append(Case(f'consolidate_ips/{dataset}', len(lines), 3,
+                          lambda lines=lines: ip_tools.consolidate_ips(lines)))
+        cases.append(Case(f'complement/{dataset}', len(lines), 3,
+                          lambda lines=lines: ip_tools.calculate_combined_complementary_ranges(lines)))
+        cases.append(Case(f'POST /consolidate/{dataset}', len(lines), 3,
+                          lambda text=text: client.post('/consolidate', data={'ip-list': text})))
+
+    lines = dense_adjacent_24s(size(20_000), random.Random(seed))
+    text = '\n'.join(lines)
+
+    def post_complement(text=text):
+        clear_caches()
+        return client.post('/calculate-complement', data={'cidr': text})
+    cases.append(Case('POST /calculate-complement/dense', len(lines), 3, post_complement))
+
+    # Upload a large file as a stream, the common case for firewall exports
+    upload = '\n'.join(sparse_single_ips(size(1_000_000), random.Random(seed))).encode()
+
+    def post_upload(upload=upload):
+        return client.post('/consolidate', data={'file': (io.BytesIO(upload), 'upload.txt'),
+                                                 'download': 'true'})
+    cases.append(Case('POST /consolidate/upload', upload.count(b'\n') + 1, 1, post_upload))
+
+    # Single lookups are measured per request, without the result cache
+    cidrs = [f"{format_ipv4(random.Random(seed + index).randrange(1 << 32))}/{8 + index % 24}"
+             for index in range(200)]
+
+    def details(cidrs=cidrs):
+        clear_caches()
+        for cidr in cidrs:
+            ip_tools.calculate_network_details(cidr)
+    cases.append(Case('calculate_network_details', len(cidrs), 20, details))
+
+    def post_network(cidr=cidrs[0]):
+        clear_caches()
+        return client.post('/calculate-network', data={'cidr': cidr})
+    cases.append(Case('POST /calculate-network', 1, 500, post_network))
+
+    def post_network_compact(cidr=cidrs[0]):
+        clear_caches()
+        return client.post('/calculate-network', data={'cidr': cidr, 'fields': 'network,broadcast,hostmin,hostmax'})
+    cases.append(Case('POST /calculate-network?fields', 1, 500, post_network_compact))
+
+    def post_batch(cidrs=cidrs):
+        clear_caches()
+        return client.post('/api/v1/networks/details', json=cidrs)
+    cases.append(Case('POST /api/v1/networks/details', len(cidrs), 20, post_batch))
+
+    ips = sparse_single_ips(size(10_000), random.Random(seed))
+    cases.append(Case('POST /api/v1/classify', len(ips), 5,
+                      lambda ips=ips: client.post('/api/v1/classify', json=ips)))
+
+    return cases
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def measure(case: Case) -> Dict[str, float]:
+    """Time the case, then run it once more under tracemalloc for peak memory."""
+    case.run()  # warm up
+    latencies = []
+    for _ in range(case.repeat):
+        gc.collect()
+        start = time.perf_counter()
+        case.run()
+        latencies.append(time.perf_counter() - start)
+
+    gc.collect()
+    tracemalloc.start()
+    case.run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    mean = sum(latencies) / len(latencies)
+    return {
+        'items': case.items,
+        'repeat': case.repeat,
+        'throughput_per_s': case.items / mean if mean else 0.0,
+        'latency_ms': {
+            'mean': mean * 1000,
+            'p50': percentile(latencies, 0.50) * 1000,
+            'p90': percentile(latencies, 0.90) * 1000,
+            'p99': percentile(latencies, 0.99) * 1000,
+        },
+        'peak_memory_bytes': peak,
+    }
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def print_comparison(results: Dict[str, dict], baseline: Dict[str, dict]) -> None:
+    print(f"{'case':45} {'p50 ms':>10} {'before':>10} {'speedup':>8} {'peak MiB':>9}", file=sys.stderr)
+    for name, result in results.items():
+        p50 = result['latency_ms']['p50']
+        before = baseline.get(name, {}).get('latency_ms', {}).get('p50')
+        speedup = f"{before / p50:7.2f}x" if before and p50 else '       -'
+        before_text = f"{before:10.2f}" if before else '         -'
+        print(f"{name:45} {p50:10.2f} {before_text} {speedup} "
+              f"{result['peak_memory_bytes'] / 2 ** 20:9.1f}", file=sys.stderr)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scale', type=float, default=1.0,
+                        help='multiply dataset sizes (e.g. 0.1 for a quick run)')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--filter', default='', help='only run cases whose name contains this')
+    parser.add_argument('--output', help='write the JSON report here instead of stdout')
+    parser.add_argument('--compare', help='previous JSON report to compare against')
+    args = parser.parse_args()
+
+    results = {}
+    for case in build_cases(args.scale, args.seed):
+        if args.filter not in case.name:
+            continue
+        print(f"running {case.name} ...", file=sys.stderr)
+        results[case.name] = measure(case)
+
+    report = {
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'scale': args.scale,
+        'seed': args.seed,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'results': results,
+    }
+
+    if args.compare:
+        with open(args.compare) as baseline:
+            print_comparison(results, json.load(baseline)['results'])
+    else:
+        print_comparison(results, {})
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as handle:
+            handle.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
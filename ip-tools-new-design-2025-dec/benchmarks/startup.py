@@ -0,0 +1,100 @@
+"""Startup-time benchmark for the web app and the command-line interface.
+
+Each case runs in a fresh interpreter, the interpreter's own startup is
+measured separately and subtracted. The run fails (exit status 1) when a
+case goes over its budget, so it can guard against slow imports creeping in.
+
+    python benchmarks/startup.py
+    python benchmarks/startup.py --app-budget-ms 400 --output startup.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from typing import Dict, List
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Code timed in a fresh interpreter for each case
+CASES = {
+    'interpreter': 'pass',
+    'import cli': 'import cli',
+    'create_app': 'import main',
+    'first request': 'import main; main.app.test_client().get("/calculate-network?cidr=10.0.0.0/24")',
+}
+
+# Budgets in milliseconds, on top of the interpreter startup
+DEFAULT_BUDGETS = {
+    'import cli': 150,
+    'create_app': 500,
+    'first request': 600,
+}
+
+
+def time_case(code: str, repeat: int) -> List[float]:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-c', code], cwd=APP_DIR, check=True)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def slowest_imports(code: str, count: int = 10) -> List[Dict[str, object]]:
+    """Return the modules that take longest to import by themselves, from -X importtime."""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=APP_DIR,
+                            capture_output=True, text=True, check=True)
+    imports = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        own, _, name = line[len('import time:'):].split('|')
+        imports.append({'module': name.strip(), 'ms': int(own) / 1000})
+    return sorted(imports, key=lambda item: item['ms'], reverse=True)[:count]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--cli-budget-ms', type=float, default=DEFAULT_BUDGETS['import cli'])
+    parser.add_argument('--app-budget-ms', type=float, default=DEFAULT_BUDGETS['create_app'])
+    parser.add_argument('--request-budget-ms', type=float, default=DEFAULT_BUDGETS['first request'])
+    parser.add_argument('--output', help='write the JSON report here instead of stdout')
+    args = parser.parse_args()
+    budgets = {
+        'import cli': args.cli_budget_ms,
+        'create_app': args.app_budget_ms,
+        'first request': args.request_budget_ms,
+    }
+
+    medians = {}
+    for name, code in CASES.items():
+        timings = sorted(time_case(code, args.repeat))
+        medians[name] = timings[len(timings) // 2]
+
+    baseline = medians['interpreter']
+    results = {}
+    over_budget = []
+    print(f"{'case':20} {'ms':>8} {'budget':>8}", file=sys.stderr)
+    for name, budget in budgets.items():
+        net = medians[name] - baseline
+        results[name] = {'ms': net, 'budget_ms': budget, 'slowest_imports': slowest_imports(CASES[name])}
+        flag = '' if net <= budget else '  OVER BUDGET'
+        print(f"{name:20} {net:8.1f} {budget:8.0f}{flag}", file=sys.stderr)
+        if net > budget:
+            over_budget.append(name)
+
+    report = json.dumps({'python': sys.version.split()[0], 'interpreter_ms': baseline,
+                         'results': results}, indent=2)
+    if args.output:
+        with open(args.output, 'w') as handle:
+            handle.write(report + '\n')
+    else:
+        print(report)
+    sys.exit(1 if over_budget else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,320 @@
+"""Calculation engine shared by the web app and the command-line interface.
+
+Nothing here imports Flask, so the CLI starts quickly.
+"""
+import json
+import os
+from functools import lru_cache
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple, Union
+
+from cidrmath import (ADDRESS_BITS, parse_cidr, prefix_bounds,
+                      format_address, format_cidr)
+from intervals import IntervalSet, parse_interval_sets
+from metrics import STAGE_SECONDS
+from special import SPECIAL_PURPOSE, address_class
+from workers import parse_interval_sets_parallel, iter_set_cidrs
+
+# Size of the LRU caches in front of the subnet and network detail calculations
+CACHE_SIZE = int(os.environ.get('IP_TOOLS_CACHE_SIZE', 4096))
+
+# Largest integer a JavaScript client can read from JSON without losing precision
+MAX_SAFE_INTEGER = 2 ** 53 - 1
+
+def json_safe_int(value: int) -> Union[int, str]:
+    """Return the value as a string when it is too large for a JSON number."""
+    return value if value <= MAX_SAFE_INTEGER else str(value)
+
+def calculate_subnet(cidr):
+    try:
+        version, address, prefixlen = parse_cidr(cidr)
+    except ValueError as e:
+        print(f"Subnet calculation error: {str(e)}")
+        return None
+    return subnet_summary(version, address, prefixlen)
+
+def subnet_summary(version: int, address: int, prefixlen: int) -> dict:
+    """Summarize an already parsed network."""
+    network, _ = prefix_bounds(version, address, prefixlen)
+    return cached_subnet(version, network, prefixlen)
+
+@lru_cache(maxsize=CACHE_SIZE)
+def cached_subnet(version: int, network: int, prefixlen: int) -> dict:
+    """Build the subnet summary of a normalized network (cached, do not modify the result)."""
+    _, broadcast = prefix_bounds(version, network, prefixlen)
+    
+    if version == 6:
+        # IPv6 has no broadcast address, every address of the prefix is usable
+        return {
+            'firstIP': format_address(6, network),
+            'lastIP': format_address(6, broadcast),
+            'totalHosts': json_safe_int(broadcast - network + 1)
+        }
+    elif prefixlen == 32:
+        return {
+            'firstIP': format_address(4, network),
+            'lastIP': format_address(4, network),
+            'totalHosts': 1
+        }
+    elif prefixlen == 31:
+        return {
+            'firstIP': format_address(4, network),
+            'lastIP': format_address(4, broadcast),
+            'totalHosts': 2
+        }
+    else:
+        return {
+            'firstIP': format_address(4, network + 1),
+            'lastIP': format_address(4, broadcast - 1),
+            'totalHosts': broadcast - network - 1
+        }
+
+def enumeration_bounds(version: int, address: int, prefixlen: int,
+                       new_prefixlen: Optional[int] = None) -> Tuple[int, int, int]:
+    """Return (first, step, count) of the subnets of a prefix, or of its hosts without new_prefixlen.
+
+    Hosts are the usable addresses of the subnet calculator, so IPv4 networks
+    larger than /31 leave out their network and broadcast address.
+    """
+    bits = ADDRESS_BITS[version]
+    network, broadcast = prefix_bounds(version, address, prefixlen)
+    if new_prefixlen is not None:
+        return network, 1 << (bits - new_prefixlen), 1 << (new_prefixlen - prefixlen)
+    if version == 4 and prefixlen < 31:
+        return network + 1, 1, broadcast - network - 1
+    return network, 1, broadcast - network + 1
+
+def iter_enumeration(version: int, first: int, step: int, start: int, stop: int,
+                     new_prefixlen: Optional[int] = None) -> Iterator[str]:
+    """Yield items start to stop (exclusive) of an enumeration, computing each one directly."""
+    for index in range(start, stop):
+        value = first + index * step
+        yield format_address(version, value) if new_prefixlen is None else format_cidr(version, value, new_prefixlen)
+
+def calculate_combined_complementary_ranges(cidrs: List[str],
+                                            universe: Optional[List[str]] = None) -> List[str]:
+    try:
+        if not cidrs:
+            return []
+
+        # Convert CIDR strings to integer ranges, split by address family
+        with STAGE_SECONDS.time('complement', 'parse'):
+            covered = parse_interval_sets_parallel(cidrs)
+            bounds = parse_interval_sets(universe or [])
+        with STAGE_SECONDS.time('complement', 'summarize'):
+            return complement_cidrs(covered, bounds)
+
+    except Exception as e:
+        print(f"Error calculating complementary ranges: {str(e)}")
+        return []
+
+def complement_cidrs(covered: Dict[int, IntervalSet], bounds: Dict[int, IntervalSet]) -> List[str]:
+    """Return the complementary CIDRs of covered interval sets, per address family."""
+    # Find the gaps of each family separately, which are the complementary ranges;
+    # without a universe the gaps span the whole IPv4 or IPv6 space
+    complementary = []
+    for version in (4, 6):
+        if not covered[version]:
+            continue
+        gaps = covered[version].complement(bounds[version] or None)
+        complementary.extend(iter_set_cidrs(gaps))
+    return complementary
+
+def consolidate_intervals(ip_lines: Iterable[str]) -> Dict[int, IntervalSet]:
+    """Parse IPs and CIDR ranges into merged integer intervals per IP version."""
+    # Each line becomes a single interval, so the cost depends on the number of
+    # lines and not on the number of addresses covered
+    return parse_interval_sets_parallel(ip_lines)
+
+def iter_consolidated_cidrs(merged: Dict[int, IntervalSet]) -> Iterator[str]:
+    """Yield consolidated CIDR strings, IPv4 ranges first."""
+    for version in (4, 6):
+        yield from iter_set_cidrs(merged[version])
+
+# Set operations of /set-operation, mapped to the IntervalSet method doing the sweep
+SET_OPERATIONS = {
+    'union': 'union',
+    'intersection': 'intersection',
+    'difference': 'difference',
+    'symmetric_difference': 'symmetric_difference'
+}
+
+def set_operation(operation: str, first: Dict[int, IntervalSet],
+                  second: Dict[int, IntervalSet]) -> Dict[int, IntervalSet]:
+    """Combine two per-version interval sets with a union, intersection or (symmetric) difference."""
+    method = SET_OPERATIONS[operation]
+    return {version: getattr(first[version], method)(second[version]) for version in (4, 6)}
+
+def consolidate_ips(ip_list: List[str]) -> List[str]:
+    """Consolidate IP addresses and CIDR ranges into the most efficient CIDR representation."""
+    try:
+        with STAGE_SECONDS.time('consolidate', 'parse'):
+            merged = consolidate_intervals(ip_list)
+        with STAGE_SECONDS.time('consolidate', 'summarize'):
+            return list(iter_consolidated_cidrs(merged))
+    except Exception:
+        return []
+
+# Binary form of every octet value, for formatting IPv4 addresses
+BINARY_OCTETS = tuple(format(octet, '08b') for octet in range(256))
+
+def format_binary_ip(ip: int) -> str:
+    """Format IP address in binary with dots between octets."""
+    if ip >> 32 == 0:
+        return (f"{BINARY_OCTETS[ip >> 24]}.{BINARY_OCTETS[(ip >> 16) & 255]}."
+                f"{BINARY_OCTETS[(ip >> 8) & 255]}.{BINARY_OCTETS[ip & 255]}")
+    binary = format(ip, '032b')
+    return f"{binary[:8]}.{binary[8:16]}.{binary[16:24]}.{binary[24:]}"
+
+def format_binary_address(version: int, value: int) -> str:
+    """Format an address in binary, as dotted octets (IPv4) or colon-separated 16-bit groups (IPv6)."""
+    if version == 4:
+        return format_binary_ip(value)
+    binary = format(value, '0128b')
+    return ':'.join(binary[start:start + 16] for start in range(0, 128, 16))
+
+def get_ip_class(version: int, address: int) -> str:
+    """Determine IP address class (IPv4 only) and type."""
+    kind = f"Class {address_class(address)}" if version == 4 else 'IPv6'
+
+    # Check if private
+    if SPECIAL_PURPOSE.is_private(version, address):
+        return f"{kind}, Private Internet"
+    return f"{kind}, Public Internet"
+
+def special_purpose(version: int, address: int) -> Optional[dict]:
+    """Return the IANA special-purpose range of an address, if it is in one."""
+    special = SPECIAL_PURPOSE.range_of(version, address)
+    return None if special is None else special.to_dict()
+
+class PrefixLengthInfo(NamedTuple):
+    """Everything about a network that only depends on its prefix length."""
+    netmask: int
+    hostmask: int
+    netmask_ip: str
+    hostmask_ip: str
+    netmask_binary: str
+    hostmask_binary: str
+    # Distance of the first and last host from the network and broadcast addresses
+    host_offset: int
+    hosts: int
+
+def prefix_length_info(version: int, prefixlen: int) -> PrefixLengthInfo:
+    bits = ADDRESS_BITS[version]
+    hostmask = (1 << (bits - prefixlen)) - 1
+    netmask = ((1 << bits) - 1) ^ hostmask
+    # Every address is usable in IPv6 (no broadcast) and in IPv4 /31 (point-to-point) and /32 (single host)
+    host_offset = 0 if version == 6 or prefixlen >= bits - 1 else 1
+    return PrefixLengthInfo(netmask, hostmask,
+                            format_address(version, netmask), format_address(version, hostmask),
+                            format_binary_address(version, netmask), format_binary_address(version, hostmask),
+                            host_offset, hostmask + 1 - 2 * host_offset)
+
+# Per-prefix-length values for each IP version, indexed by prefix length
+PREFIX_TABLES = {version: tuple(prefix_length_info(version, prefixlen) for prefixlen in range(bits + 1))
+                 for version, bits in ADDRESS_BITS.items()}
+
+def host_range(version: int, network: int, broadcast: int, prefixlen: int) -> Tuple[int, int, int]:
+    """Return the first and last host address of a network and the number of hosts."""
+    info = PREFIX_TABLES[version][prefixlen]
+    return network + info.host_offset, broadcast - info.host_offset, info.hosts
+
+# Fields of the compact /calculate-network layouts, in their default order
+NETWORK_FIELDS = ('address', 'netmask', 'wildcard', 'network', 'hostmin', 'hostmax', 'broadcast',
+                  'prefixlen', 'hosts', 'class', 'special')
+
+@lru_cache(maxsize=CACHE_SIZE)
+def cached_compact_details(version: int, input_ip: int, prefixlen: int, fields: Tuple[str, ...]) -> tuple:
+    """Compute only the requested network fields, as plain values without binary strings."""
+    info = PREFIX_TABLES[version][prefixlen]
+    network = input_ip & info.netmask
+    broadcast = network | info.hostmask
+    addresses = {
+        'address': input_ip,
+        'network': network,
+        'broadcast': broadcast,
+        'hostmin': network + info.host_offset,
+        'hostmax': broadcast - info.host_offset
+    }
+
+    values = []
+    for field in fields:
+        if field in addresses:
+            values.append(format_address(version, addresses[field]))
+        elif field == 'netmask':
+            values.append(info.netmask_ip)
+        elif field == 'wildcard':
+            values.append(info.hostmask_ip)
+        elif field == 'prefixlen':
+            values.append(prefixlen)
+        elif field == 'hosts':
+            values.append(json_safe_int(info.hosts))
+        elif field == 'special':
+            special = SPECIAL_PURPOSE.range_of(version, input_ip)
+            values.append(None if special is None else special.name)
+        else:
+            values.append(get_ip_class(version, input_ip))
+    return tuple(values)
+
+def calculate_network_details(cidr: str, include_binary: bool = True) -> dict:
+    """Calculate detailed network information similar to ipcalc."""
+    try:
+        # A single IP is treated as a host-length (/32) network
+        version, input_ip, prefixlen = parse_cidr(cidr)
+    except ValueError as e:
+        return {
+            'success': False,
+            'error': str(e)
+        }
+    return cached_network_details(version, input_ip, prefixlen, include_binary)
+
+@lru_cache(maxsize=CACHE_SIZE)
+def cached_network_details(version: int, input_ip: int, prefixlen: int,
+                           include_binary: bool = True) -> dict:
+    """Build the details of a parsed network (cached, do not modify the result)."""
+    info = PREFIX_TABLES[version][prefixlen]
+    network = input_ip & info.netmask
+    broadcast = network | info.hostmask
+
+    details = {
+        'address': {'ip': format_address(version, input_ip)},
+        'netmask': {'ip': info.netmask_ip},
+        'wildcard': {'ip': info.hostmask_ip},
+        'network': {'ip': format_address(version, network)},
+        'hostmin': {'ip': format_address(version, network + info.host_offset)},
+        'hostmax': {'ip': format_address(version, broadcast - info.host_offset)},
+        'broadcast': {'ip': format_address(version, broadcast)}
+    }
+    if include_binary:
+        details['address']['binary'] = format_binary_address(version, input_ip)
+        details['netmask']['binary'] = info.netmask_binary
+        details['wildcard']['binary'] = info.hostmask_binary
+        details['network']['binary'] = format_binary_address(version, network)
+        details['hostmin']['binary'] = format_binary_address(version, network + info.host_offset)
+        details['hostmax']['binary'] = format_binary_address(version, broadcast - info.host_offset)
+        details['broadcast']['binary'] = format_binary_address(version, broadcast)
+    details['netmask']['cidr'] = prefixlen
+    details['hosts'] = json_safe_int(info.hosts)
+    details['class'] = get_ip_class(version, input_ip)
+    details['special'] = special_purpose(version, input_ip)
+
+    return {
+        'success': True,
+        'details': details
+    }
+
+def calculate_network_details_batch(items: Iterable, include_binary: bool = True) -> Iterator[dict]:
+    """Calculate network details for each item, reporting errors per item."""
+    for item in items:
+        cidr = item.get('cidr') if isinstance(item, dict) else item
+        if not isinstance(cidr, str) or not cidr.strip():
+            yield {'cidr': cidr, 'success': False, 'error': 'CIDR notation required'}
+            continue
+        yield {'cidr': cidr, **calculate_network_details(cidr.strip(), include_binary)}
+
+def iter_ndjson_items(lines: Iterable[str]) -> Iterator:
+    """Decode one JSON value per line, passing undecodable lines on as their raw text."""
+    for line in lines:
+        try:
+            yield json.loads(line)
+        except ValueError:
+            yield {'cidr': line}
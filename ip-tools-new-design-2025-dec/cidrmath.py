@@ -0,0 +1,113 @@
+import ipaddress
+from typing import List, Tuple, Union
+
+# Address width in bits for each IP version
+ADDRESS_BITS = {4: 32, 6: 128}
+
+
+def parse_cidr(text: str) -> Tuple[int, int, int]:
+    """Parse an IP address or CIDR string into (version, address, prefixlen) integers.
+
+    The address keeps its host bits, a bare address gets a full-length prefix.
+    Plain dotted-quad input is parsed directly, anything else goes through the
+    ipaddress module. Raises ValueError for invalid input.
+    """
+    text = text.strip()
+    address, slash, prefix = text.partition('/')
+
+    # Fast path for the common a.b.c.d[/nn] form
+    octets = address.split('.')
+    if len(octets) == 4 and (not slash or (prefix.isascii() and prefix.isdigit())):
+        value = 0
+        for octet in octets:
+            if not (octet.isascii() and octet.isdigit()) or len(octet) > 3 \
+                    or (len(octet) > 1 and octet[0] == '0'):
+                break
+            number = int(octet)
+            if number > 255:
+                break
+            value = (value << 8) | number
+        else:
+            prefixlen = int(prefix) if slash else 32
+            if prefixlen <= 32:
+                return 4, value, prefixlen
+
+    if slash:
+        network = ipaddress.ip_network(text, strict=False)
+        ip = ipaddress.ip_address(address.strip())
+        return network.version, int(ip), network.prefixlen
+    ip = ipaddress.ip_address(address)
+    return ip.version, int(ip), ADDRESS_BITS[ip.version]
+
+
+def prefix_bounds(version: int, address: int, prefixlen: int) -> Tuple[int, int]:
+    """Return the first and last address of the prefix containing the address."""
+    host_mask = (1 << (ADDRESS_BITS[version] - prefixlen)) - 1
+    network = address & ~host_mask
+    return network, network | host_mask
+
+
+def netmask_int(version: int, prefixlen: int) -> int:
+    """Return the netmask of a prefix length as an integer."""
+    bits = ADDRESS_BITS[version]
+    return ((1 << bits) - 1) ^ ((1 << (bits - prefixlen)) - 1)
+
+
+def ip_object(version: int, value: int) -> Union[ipaddress.IPv4Address, ipaddress.IPv6Address]:
+    """Build an ipaddress object, for the few checks that still need one."""
+    if version == 4:
+        return ipaddress.IPv4Address(value)
+    return ipaddress.IPv6Address(value)
+
+
+def format_address(version: int, value: int) -> str:
+    """Format an integer address as a dotted-quad or compressed IPv6 string."""
+    if version == 4:
+        return f"{value >> 24}.{(value >> 16) & 255}.{(value >> 8) & 255}.{value & 255}"
+
+    groups = [(value >> shift) & 0xffff for shift in range(112, -1, -16)]
+
+    # Find the longest run of zero groups (the first one wins a tie)
+    best_start, best_length = -1, 0
+    run_start, run_length = -1, 0
+    for index, group in enumerate(groups):
+        if group == 0:
+            if run_length == 0:
+                run_start = index
+            run_length += 1
+            if run_length > best_length:
+                best_start, best_length = run_start, run_length
+        else:
+            run_length = 0
+
+    hexes = [f"{group:x}" for group in groups]
+    if best_length < 2:
+        return ':'.join(hexes)
+    head = ':'.join(hexes[:best_start])
+    tail = ':'.join(hexes[best_start + best_length:])
+    return f"{head}::{tail}"
+
+
+def format_cidr(version: int, network: int, prefixlen: int) -> str:
+    """Format a (network, prefixlen) pair as a CIDR string."""
+    return f"{format_address(version, network)}/{prefixlen}"
+
+
+def range_to_cidrs(start: int, end: int, bits: int) -> List[Tuple[int, int]]:
+    """Split an inclusive integer range into (network, prefixlen) blocks.
+
+    Each step takes the largest block that is aligned on the current start
+    (its trailing zero bits) and still fits in the remaining span.
+    """
+    blocks = []
+    while start <= end:
+        if start:
+            host_bits = (start & -start).bit_length() - 1
+        else:
+            host_bits = bits
+        span_bits = (end - start + 1).bit_length() - 1
+        if host_bits > span_bits:
+            host_bits = span_bits
+        blocks.append((start, bits - host_bits))
+        start += 1 << host_bits
+    return blocks
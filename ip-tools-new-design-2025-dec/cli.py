@@ -0,0 +1,100 @@
+"""Command-line interface to the IP Tools calculations, without the web app.
+
+    python cli.py consolidate ranges.txt more.txt.gz > consolidated.txt
+    cat used.txt | python cli.py complement --universe 10.0.0.0/8
+    python cli.py details 10.0.0.0/24 192.168.1.1/31 --no-binary
+
+Inputs are files (plain or gzipped) or stdin, one IP or CIDR per line, and
+results are written to stdout as they are produced.
+"""
+import argparse
+import json
+import sys
+from itertools import chain
+from typing import Iterable, Iterator, List
+
+from calculator import (complement_cidrs, consolidate_intervals, iter_consolidated_cidrs,
+                        calculate_network_details_batch)
+from intervals import parse_interval_sets
+from uploads import iter_upload_lines, iter_text_lines
+
+
+def iter_input_lines(paths: List[str]) -> Iterator[str]:
+    """Yield the stripped, non-empty lines of the given files, or of stdin without any."""
+    for path in paths or ['-']:
+        if path == '-':
+            yield from iter_upload_lines(sys.stdin.buffer)
+            continue
+        with open(path, 'rb') as handle:
+            yield from iter_upload_lines(handle)
+
+
+def write_lines(lines: Iterable[str]) -> None:
+    written = False
+    for text in iter_text_lines(lines):
+        sys.stdout.write(text)
+        written = True
+    if written:
+        sys.stdout.write('\n')
+
+
+def consolidate_command(args: argparse.Namespace) -> int:
+    write_lines(iter_consolidated_cidrs(consolidate_intervals(iter_input_lines(args.files))))
+    return 0
+
+
+def complement_command(args: argparse.Namespace) -> int:
+    universe = chain(args.universe, iter_input_lines(args.universe_file) if args.universe_file else [])
+    write_lines(complement_cidrs(consolidate_intervals(iter_input_lines(args.files)),
+                                 parse_interval_sets(universe)))
+    return 0
+
+
+def details_command(args: argparse.Namespace) -> int:
+    items = args.cidrs if args.cidrs else iter_input_lines(args.file)
+    failed = False
+    for result in calculate_network_details_batch(items, not args.no_binary):
+        failed = failed or not result['success']
+        sys.stdout.write(json.dumps(result) + '\n')
+    return 1 if failed else 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='ip-tools', description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    consolidate = commands.add_parser('consolidate', help='merge IPs and CIDRs into the fewest CIDR blocks')
+    consolidate.add_argument('files', nargs='*', help='input files (default: stdin)')
+    consolidate.set_defaults(run=consolidate_command)
+
+    complement = commands.add_parser('complement', help='list the CIDR blocks not covered by the input')
+    complement.add_argument('files', nargs='*', help='input files (default: stdin)')
+    complement.add_argument('--universe', action='append', default=[], metavar='CIDR',
+                            help='only complement within this prefix (repeatable)')
+    complement.add_argument('--universe-file', action='append', metavar='FILE',
+                            help='file of universe prefixes (repeatable)')
+    complement.set_defaults(run=complement_command)
+
+    details = commands.add_parser('details', help='print network details as JSON lines')
+    details.add_argument('cidrs', nargs='*', help='CIDRs to describe (default: read from stdin)')
+    details.add_argument('--file', action='append', default=[], help='read CIDRs from a file (repeatable)')
+    details.add_argument('--no-binary', action='store_true', help='leave out the binary representations')
+    details.set_defaults(run=details_command)
+    return parser
+
+
+def main(argv: List[str] = None) -> int:
+    args = build_parser().parse_args(argv)
+    try:
+        return args.run(args)
+    except BrokenPipeError:
+        # The reader (head, grep -m) went away, which is not an error
+        sys.stderr.close()
+        return 0
+    except (OSError, ValueError) as e:
+        print(f"ip-tools: {e}", file=sys.stderr)
+        return 2
+
+
+if __name__ == '__main__':
+    sys.exit(main())
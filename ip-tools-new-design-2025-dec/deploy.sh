@@ -29,6 +29,8 @@ source venv/bin/activate
 pip install -r requirements.txt
 
 # Create systemd service
+# A single worker with threads: background jobs live in the worker that accepted them,
+# and large inputs are spread over a process pool with one process per CPU instead
 sudo tee /etc/systemd/system/ip-tools.service > /dev/null <<EOF
 [Unit]
 Description=IP Tools Suite
@@ -39,7 +41,8 @@ Type=exec
 User=$USER
 WorkingDirectory=/opt/ip-tools-suite
 Environment=PATH=/opt/ip-tools-suite/venv/bin
-ExecStart=/opt/ip-tools-suite/venv/bin/gunicorn --bind 0.0.0.0:5000 --workers 4 main:app
+Environment=IP_TOOLS_POOL_WORKERS=$(nproc)
+ExecStart=/opt/ip-tools-suite/venv/bin/gunicorn --config /opt/ip-tools-suite/gunicorn.conf.py --bind 0.0.0.0:5000 --workers 1 --threads 8 --timeout 120 main:app
 Restart=always
 
 [Install]
@@ -0,0 +1,16 @@
+import gc
+
+# Build the app once in the master process; forked workers start with the code,
+# compiled template and prefix data already loaded instead of importing it all again
+preload_app = True
+
+
+def when_ready(server):
+    import vectorized
+
+    # Import NumPy (if enabled) before forking, so workers share it as well
+    if vectorized.VECTORIZED:
+        vectorized.load_numpy()
+    # Move everything loaded so far out of the garbage collector's reach, otherwise
+    # its bookkeeping writes would copy the shared pages into every worker
+    gc.freeze()
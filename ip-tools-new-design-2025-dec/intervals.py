@@ -0,0 +1,349 @@
+import heapq
+from array import array
+from bisect import bisect_right
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple, Union
+
+from cidrmath import ADDRESS_BITS, parse_cidr, prefix_bounds, format_cidr, range_to_cidrs
+
+# An inclusive (start, end) range of addresses as integers
+Interval = Tuple[int, int]
+
+LOW_64_BITS = (1 << 64) - 1
+
+# Intervals buffered by IntervalSetBuilder before they are sorted into a run
+BUILDER_BATCH_SIZE = 1 << 18
+
+# Sorted runs kept by IntervalSetBuilder before they are merged into one
+BUILDER_MAX_RUNS = 64
+
+
+def parse_interval(item: str) -> Tuple[int, int, int]:
+    """Parse an IP address or CIDR string into (version, start, end) integers.
+
+    Raises ValueError if the item is neither a valid address nor a network.
+    """
+    version, address, prefixlen = parse_cidr(item)
+    start, end = prefix_bounds(version, address, prefixlen)
+    return version, start, end
+
+
+def coalesce_intervals(intervals: Iterable[Interval]) -> Iterator[Interval]:
+    """Merge already sorted intervals that overlap or are adjacent."""
+    iterator = iter(intervals)
+    for current_start, current_end in iterator:
+        break
+    else:
+        return
+
+    for start, end in iterator:
+        if start <= current_end + 1:
+            if end > current_end:
+                current_end = end
+        else:
+            yield current_start, current_end
+            current_start, current_end = start, end
+    yield current_start, current_end
+
+
+def merge_intervals(intervals: Iterable[Interval]) -> List[Interval]:
+    """Sort intervals and merge the ones that overlap or are adjacent."""
+    return list(coalesce_intervals(sorted(intervals)))
+
+
+def intersect_intervals(first: Iterable[Interval], second: Iterable[Interval]) -> Iterator[Interval]:
+    """Yield the overlap of two sorted, merged interval sequences."""
+    first, second = iter(first), iter(second)
+    a = next(first, None)
+    b = next(second, None)
+    while a is not None and b is not None:
+        start = max(a[0], b[0])
+        end = min(a[1], b[1])
+        if start <= end:
+            yield start, end
+        # Advance whichever interval finishes first
+        if a[1] < b[1]:
+            a = next(first, None)
+        else:
+            b = next(second, None)
+
+
+def subtract_intervals(base: Iterable[Interval], covered: Iterable[Interval]) -> Iterator[Interval]:
+    """Yield the parts of the sorted, merged base intervals not in the covered ones."""
+    covered = iter(covered)
+    current_cover = next(covered, None)
+    for start, end in base:
+        # Skip covered intervals that end before this base interval starts
+        while current_cover is not None and current_cover[1] < start:
+            current_cover = next(covered, None)
+        while current_cover is not None and current_cover[0] <= end:
+            if current_cover[0] > start:
+                yield start, current_cover[0] - 1
+            start = current_cover[1] + 1
+            if current_cover[1] > end:
+                break
+            current_cover = next(covered, None)
+        if start <= end:
+            yield start, end
+
+
+def iter_cidrs(version: int, intervals: Iterable[Interval]) -> Iterator[str]:
+    """Yield the minimal CIDR strings covering merged intervals, one at a time."""
+    bits = ADDRESS_BITS[version]
+    for start, end in intervals:
+        for network, prefixlen in range_to_cidrs(start, end, bits):
+            yield format_cidr(version, network, prefixlen)
+
+
+class WideArray:
+    """Array of unsigned 128-bit integers stored as two array('Q') halves."""
+
+    __slots__ = ('high', 'low')
+
+    def __init__(self):
+        self.high = array('Q')
+        self.low = array('Q')
+
+    def append(self, value: int) -> None:
+        self.high.append(value >> 64)
+        self.low.append(value & LOW_64_BITS)
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[int, 'WideArray']:
+        if isinstance(index, slice):
+            part = WideArray()
+            part.high = array('Q', self.high[index])
+            part.low = array('Q', self.low[index])
+            return part
+        return (self.high[index] << 64) | self.low[index]
+
+    def __len__(self) -> int:
+        return len(self.low)
+
+    def __iter__(self) -> Iterator[int]:
+        for high, low in zip(self.high, self.low):
+            yield (high << 64) | low
+
+    @property
+    def itemsize(self) -> int:
+        return self.high.itemsize + self.low.itemsize
+
+
+def new_address_array(version: int) -> Union[array, WideArray]:
+    """Return an empty compact array able to hold addresses of the given IP version."""
+    return array('Q') if version == 4 else WideArray()
+
+
+class IntervalSet:
+    """Sorted, merged address intervals of one IP version kept in compact arrays.
+
+    Each interval costs 16 bytes for IPv4 and 32 bytes for IPv6, instead of a
+    tuple of Python ints. All set operations are linear sweeps over the sorted
+    intervals and return a new IntervalSet.
+    """
+
+    __slots__ = ('version', 'starts', 'ends')
+
+    def __init__(self, version: int, intervals: Iterable[Interval] = ()):
+        """Store intervals that are already sorted and merged."""
+        self.version = version
+        self.starts = new_address_array(version)
+        self.ends = new_address_array(version)
+        for start, end in intervals:
+            self.starts.append(start)
+            self.ends.append(end)
+
+    @classmethod
+    def from_intervals(cls, version: int, intervals: Iterable[Interval]) -> 'IntervalSet':
+        """Build a set from intervals in any order, merging overlaps."""
+        return cls(version, coalesce_intervals(sorted(intervals)))
+
+    @classmethod
+    def union_all(cls, version: int, sets: Iterable['IntervalSet']) -> 'IntervalSet':
+        """Merge any number of sets of the same IP version in a single sweep."""
+        return cls(version, coalesce_intervals(heapq.merge(*sets)))
+
+    @classmethod
+    def full(cls, version: int) -> 'IntervalSet':
+        """Return the set covering the whole address space of an IP version."""
+        return cls(version, [(0, (1 << ADDRESS_BITS[version]) - 1)])
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def __iter__(self) -> Iterator[Interval]:
+        return zip(self.starts, self.ends)
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, IntervalSet):
+            return NotImplemented
+        return self.version == other.version and list(self) == list(other)
+
+    def __repr__(self) -> str:
+        return f"IntervalSet(version={self.version}, intervals={len(self)})"
+
+    @property
+    def num_addresses(self) -> int:
+        return sum(self.ends) - sum(self.starts) + len(self)
+
+    @property
+    def nbytes(self) -> int:
+        return len(self) * (self.starts.itemsize + self.ends.itemsize)
+
+    def _check_version(self, other: 'IntervalSet') -> None:
+        if other.version != self.version:
+            raise ValueError(f"Cannot combine IPv{self.version} and IPv{other.version} interval sets")
+
+    def union(self, other: 'IntervalSet') -> 'IntervalSet':
+        self._check_version(other)
+        return IntervalSet(self.version, coalesce_intervals(heapq.merge(self, other)))
+
+    def intersection(self, other: 'IntervalSet') -> 'IntervalSet':
+        self._check_version(other)
+        return IntervalSet(self.version, intersect_intervals(self, other))
+
+    def difference(self, other: 'IntervalSet') -> 'IntervalSet':
+        self._check_version(other)
+        return IntervalSet(self.version, subtract_intervals(self, other))
+
+    def symmetric_difference(self, other: 'IntervalSet') -> 'IntervalSet':
+        self._check_version(other)
+        # Both differences are disjoint and sorted, one merge sweep joins them
+        return IntervalSet(self.version, coalesce_intervals(heapq.merge(
+            subtract_intervals(self, other), subtract_intervals(other, self))))
+
+    def complement(self, universe: Optional['IntervalSet'] = None) -> 'IntervalSet':
+        """Return the gaps within the universe, or within the whole address space."""
+        if universe is None:
+            universe = IntervalSet.full(self.version)
+        return universe.difference(self)
+
+    def find(self, address: int) -> Optional[Interval]:
+        """Return the interval containing an address, if any."""
+        index = bisect_right(self.starts, address) - 1
+        if index >= 0 and self.ends[index] >= address:
+            return self.starts[index], self.ends[index]
+        return None
+
+    def containing_block(self, address: int) -> Optional[Tuple[int, int]]:
+        """Return the (network, prefixlen) CIDR block of the set that contains an address."""
+        interval = self.find(address)
+        if interval is None:
+            return None
+        for network, prefixlen in range_to_cidrs(*interval, ADDRESS_BITS[self.version]):
+            if address < network + (1 << (ADDRESS_BITS[self.version] - prefixlen)):
+                return network, prefixlen
+        return None
+
+    def split(self, size: int) -> List['IntervalSet']:
+        """Cut the set into consecutive address ranges of at most size intervals each."""
+        parts = []
+        for index in range(0, len(self), size):
+            part = IntervalSet(self.version)
+            if self.version == 4:
+                # Copy into arrays, the columns may be views of a memory-mapped snapshot
+                part.starts = array('Q', self.starts[index:index + size])
+                part.ends = array('Q', self.ends[index:index + size])
+            else:
+                part.starts = self.starts[index:index + size]
+                part.ends = self.ends[index:index + size]
+            parts.append(part)
+        return parts
+
+    def iter_cidrs(self) -> Iterator[str]:
+        return iter_cidrs(self.version, self)
+
+
+class IntervalSetBuilder:
+    """Collect unsorted intervals of one IP version into an IntervalSet.
+
+    Pending intervals are packed into a single integer each (start in the high
+    bits, end in the low bits) and sorted in bounded batches. The sorted runs
+    are merged in a single sweep by build(), instead of merging the whole
+    result again for every batch.
+    """
+
+    def __init__(self, version: int, batch_size: int = BUILDER_BATCH_SIZE):
+        self.version = version
+        self.bits = ADDRESS_BITS[version]
+        self.batch_size = batch_size
+        self.pending = array('Q') if version == 4 else []
+        self.runs: List[IntervalSet] = []
+
+    def add(self, start: int, end: int) -> None:
+        self.pending.append((start << self.bits) | end)
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self.pending:
+            return
+        end_mask = (1 << self.bits) - 1
+        batch = IntervalSet(self.version, coalesce_intervals(
+            (key >> self.bits, key & end_mask) for key in sorted(self.pending)))
+        del self.pending[:]
+        self.runs.append(batch)
+        if len(self.runs) >= BUILDER_MAX_RUNS:
+            self.runs = [IntervalSet.union_all(self.version, self.runs)]
+
+    def build(self) -> IntervalSet:
+        self.flush()
+        if len(self.runs) == 1:
+            return self.runs[0]
+        return IntervalSet.union_all(self.version, self.runs)
+
+
+def build_interval_sets(intervals: Iterable[Tuple[int, int, int]]) -> Dict[int, IntervalSet]:
+    """Collect (version, start, end) intervals into an IntervalSet per IP version."""
+    builders = {4: IntervalSetBuilder(4), 6: IntervalSetBuilder(6)}
+    for version, start, end in intervals:
+        builders[version].add(start, end)
+    return {version: builder.build() for version, builder in builders.items()}
+
+
+def iter_valid_intervals(items: Iterable[str]) -> Iterator[Tuple[int, int, int]]:
+    """Parse items into (version, start, end) intervals, skipping invalid entries."""
+    for item in items:
+        try:
+            yield parse_interval(item)
+        except ValueError:
+            continue
+
+
+def parse_interval_sets(items: Iterable[str]) -> Dict[int, IntervalSet]:
+    """Parse IPs and CIDR ranges into an IntervalSet per IP version, skipping invalid entries."""
+    return build_interval_sets(iter_valid_intervals(items))
+
+
+class ParsedCidr(NamedTuple):
+    """A validated input line, as parsed by parse_cidr_lines."""
+    line: int
+    text: str
+    version: int
+    address: int
+    prefixlen: int
+
+
+def parse_cidr_lines(lines: Iterable[str]) -> Tuple[List[ParsedCidr], List[dict]]:
+    """Parse input lines once, returning the valid entries and per-line errors.
+
+    Blank lines are skipped but still counted, so line numbers match the input.
+    """
+    parsed = []
+    errors = []
+    for number, line in enumerate(lines, 1):
+        text = line.strip()
+        if not text:
+            continue
+        try:
+            version, address, prefixlen = parse_cidr(text)
+        except ValueError as e:
+            errors.append({'line': number, 'cidr': text, 'error': str(e)})
+            continue
+        parsed.append(ParsedCidr(number, text, version, address, prefixlen))
+    return parsed, errors
+
+
+def interval_sets_from_parsed(parsed: Iterable[ParsedCidr]) -> Dict[int, IntervalSet]:
+    """Build an IntervalSet per IP version from already parsed entries."""
+    return build_interval_sets(
+        (entry.version, *prefix_bounds(entry.version, entry.address, entry.prefixlen))
+        for entry in parsed)
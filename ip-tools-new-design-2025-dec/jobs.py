@@ -0,0 +1,136 @@
+import os
+import secrets
+import threading
+import time
+import traceback
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+# Background threads running submitted jobs
+JOB_THREADS = int(os.environ.get('IP_TOOLS_JOB_THREADS', 2))
+
+# Most jobs (queued, running or finished) kept at once
+JOB_LIMIT = int(os.environ.get('IP_TOOLS_JOB_LIMIT', 32))
+
+# Seconds a finished job and its result are kept
+JOB_TTL = int(os.environ.get('IP_TOOLS_JOB_TTL', 3600))
+
+
+class JobLimitError(Exception):
+    """Raised when the store is full of jobs that have not finished yet."""
+
+
+class JobInputError(ValueError):
+    """Raised by a job when its input is invalid, with the per-line errors."""
+
+    def __init__(self, message: str, errors: List[dict]):
+        super().__init__(message)
+        self.errors = errors
+
+
+class Job:
+    """A background calculation with progress counters and, once done, a result."""
+
+    def __init__(self, kind: str):
+        self.id = secrets.token_urlsafe(16)
+        self.kind = kind
+        self.status = 'queued'
+        self.stage = None
+        self.progress: Dict[str, int] = {}
+        self.result: Any = None
+        self.error: Optional[str] = None
+        # Per-line errors when the job failed on invalid input rather than on a bug
+        self.errors: Optional[List[dict]] = None
+        self.created = time.time()
+        self.finished: Optional[float] = None
+
+    @property
+    def done(self) -> bool:
+        return self.status in ('done', 'failed')
+
+    def track(self, lines: Iterable[str], key: str = 'lines_parsed',
+              every: int = 10_000) -> Iterator[str]:
+        """Pass lines through while counting them in the job progress."""
+        count = 0
+        self.progress[key] = 0
+        for line in lines:
+            count += 1
+            if count % every == 0:
+                self.progress[key] = count
+            yield line
+        self.progress[key] = count
+
+    def to_dict(self) -> dict:
+        return {
+            'id': self.id,
+            'type': self.kind,
+            'status': self.status,
+            'stage': self.stage,
+            'progress': dict(self.progress),
+            'error': self.error,
+            'created': self.created,
+            'finished': self.finished
+        }
+
+
+class JobStore:
+    """Bounded store of background jobs with TTL eviction of finished ones."""
+
+    def __init__(self, limit: int = JOB_LIMIT, ttl: int = JOB_TTL, threads: int = JOB_THREADS):
+        self.limit = limit
+        self.ttl = ttl
+        self.threads = threads
+        self.jobs: 'OrderedDict[str, Job]' = OrderedDict()
+        self.lock = threading.Lock()
+        self.executor: Optional[ThreadPoolExecutor] = None
+
+    def _evict(self) -> None:
+        """Drop expired jobs, then the oldest finished ones while over the limit."""
+        now = time.time()
+        for job_id, job in list(self.jobs.items()):
+            if job.done and now - job.finished > self.ttl:
+                del self.jobs[job_id]
+        for job_id, job in list(self.jobs.items()):
+            if len(self.jobs) < self.limit:
+                break
+            if job.done:
+                del self.jobs[job_id]
+
+    def submit(self, kind: str, func: Callable[..., Any], *args: Any) -> Job:
+        """Queue func(job, *args) in the background; its return value becomes the result."""
+        job = Job(kind)
+        with self.lock:
+            self._evict()
+            if len(self.jobs) >= self.limit:
+                raise JobLimitError('Too many jobs are running, try again later')
+            self.jobs[job.id] = job
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(max_workers=self.threads,
+                                                   thread_name_prefix='ip-tools-job')
+        self.executor.submit(self._run, job, func, args)
+        return job
+
+    def _run(self, job: Job, func: Callable[..., Any], args: tuple) -> None:
+        job.status = 'running'
+        try:
+            job.result = func(job, *args)
+            status = 'done'
+        except JobInputError as e:
+            job.error = str(e)
+            job.errors = e.errors
+            status = 'failed'
+        except Exception as e:
+            print(f"Job {job.id} failed: {str(e)}")
+            traceback.print_exc()
+            job.error = str(e)
+            status = 'failed'
+        # Set the finish time first, eviction relies on it once the job is done
+        job.stage = None
+        job.finished = time.time()
+        job.status = status
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self.lock:
+            self._evict()
+            return self.jobs.get(job_id)
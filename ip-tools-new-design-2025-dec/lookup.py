@@ -0,0 +1,197 @@
+import os
+import re
+import threading
+from array import array
+from bisect import bisect_right
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from cidrmath import ADDRESS_BITS, parse_cidr, prefix_bounds, format_cidr
+from intervals import IntervalSet
+
+# Label of address ranges not covered by any prefix
+NO_PREFIX = -1
+
+# Allowed names for prefix lists, they end up in URLs and file names
+LIST_NAME = re.compile(r'^[A-Za-z0-9][A-Za-z0-9_.-]{0,63}$')
+
+# Most prefix lists kept in memory, and most prefixes over all of them (0 for no limit)
+PREFIX_LIST_LIMIT = int(os.environ.get('IP_TOOLS_PREFIX_LIST_LIMIT', 64))
+PREFIX_LIST_MAX_PREFIXES = int(os.environ.get('IP_TOOLS_PREFIX_LIST_MAX_PREFIXES', 10_000_000))
+
+
+def flatten_prefixes(prefixes: List[Tuple[int, int, int]]) -> Tuple[List[int], List[int]]:
+    """Turn nested (start, end, label) prefixes into disjoint labelled ranges.
+
+    Returns the sorted start of every range and, for each, the label of the
+    most specific prefix covering it (NO_PREFIX for gaps). Prefixes never
+    partially overlap, so a stack of the currently open prefixes is enough.
+    """
+    starts: List[int] = []
+    labels: List[int] = []
+
+    def emit(position: int, label: int) -> None:
+        if starts and starts[-1] == position:
+            labels[-1] = label
+            if len(labels) > 1 and labels[-2] == label:
+                starts.pop()
+                labels.pop()
+        elif not labels or labels[-1] != label:
+            starts.append(position)
+            labels.append(label)
+
+    # Outer prefixes sort before the prefixes nested at the same start
+    stack: List[Tuple[int, int]] = []
+    for start, end, label in sorted(prefixes, key=lambda prefix: (prefix[0], -prefix[1])):
+        while stack and stack[-1][0] < start:
+            closed_end, _ = stack.pop()
+            emit(closed_end + 1, stack[-1][1] if stack else NO_PREFIX)
+        stack.append((end, label))
+        emit(start, label)
+    while stack:
+        closed_end, _ = stack.pop()
+        emit(closed_end + 1, stack[-1][1] if stack else NO_PREFIX)
+
+    if not starts or starts[0] != 0:
+        starts.insert(0, 0)
+        labels.insert(0, NO_PREFIX)
+    return starts, labels
+
+
+class AddressLookup:
+    """Shared single and batch lookups on top of an integer lookup_int()."""
+
+    def lookup_int(self, version: int, address: int) -> Optional[str]:
+        raise NotImplementedError
+
+    def lookup(self, ip: str) -> Optional[str]:
+        """Return the prefix containing an IP address, if any.
+
+        Raises ValueError if the input is not a single IP address.
+        """
+        version, address, prefixlen = parse_cidr(ip)
+        if prefixlen != ADDRESS_BITS[version]:
+            raise ValueError(f"{ip!r} is not a single IP address")
+        return self.lookup_int(version, address)
+
+    def lookup_many(self, ips: Iterable[str]) -> List[Tuple[str, Optional[str], Optional[str]]]:
+        """Look up many IP addresses, returning (ip, prefix, error) for each."""
+        results = []
+        lookup_int = self.lookup_int
+        for ip in ips:
+            try:
+                version, address, prefixlen = parse_cidr(ip)
+            except (ValueError, AttributeError):
+                results.append((ip, None, 'Invalid IP address'))
+                continue
+            if prefixlen != ADDRESS_BITS[version]:
+                results.append((ip, None, 'Not a single IP address'))
+                continue
+            results.append((ip, lookup_int(version, address), None))
+        return results
+
+
+class PrefixIndex(AddressLookup):
+    """Longest-prefix-match index over a list of IPv4 and IPv6 prefixes.
+
+    Prefixes are flattened into disjoint ranges, each labelled with its most
+    specific prefix, so a lookup is a single bisect over a sorted array.
+    """
+
+    def __init__(self, prefixes: Iterable[str]):
+        self.prefixes: List[str] = []
+        self.invalid = 0
+        ranges: Dict[int, List[Tuple[int, int, int]]] = {4: [], 6: []}
+        for item in prefixes:
+            try:
+                version, address, prefixlen = parse_cidr(item)
+            except ValueError:
+                self.invalid += 1
+                continue
+            start, end = prefix_bounds(version, address, prefixlen)
+            ranges[version].append((start, end, len(self.prefixes)))
+            self.prefixes.append(format_cidr(version, start, prefixlen))
+
+        self.starts: Dict[int, object] = {}
+        self.labels: Dict[int, array] = {}
+        for version in (4, 6):
+            starts, labels = flatten_prefixes(ranges[version])
+            # IPv4 starts fit an unsigned 64-bit array, IPv6 needs Python ints
+            self.starts[version] = array('Q', starts) if version == 4 else starts
+            self.labels[version] = array('l', labels)
+
+    def __len__(self) -> int:
+        return len(self.prefixes)
+
+    def lookup_int(self, version: int, address: int) -> Optional[str]:
+        """Return the most specific prefix containing an integer address, if any."""
+        index = bisect_right(self.starts[version], address) - 1
+        label = self.labels[version][index]
+        return None if label == NO_PREFIX else self.prefixes[label]
+
+    def stats(self) -> dict:
+        return {
+            'prefixes': len(self.prefixes),
+            'invalid': self.invalid,
+            'ranges': sum(len(labels) for labels in self.labels.values())
+        }
+
+
+class IntervalSetIndex(AddressLookup):
+    """Lookup over consolidated interval sets, such as a loaded snapshot.
+
+    The original prefixes are merged away, so the answer is the CIDR block of
+    the consolidated set that contains the address.
+    """
+
+    def __init__(self, sets: Dict[int, IntervalSet]):
+        self.sets = sets
+
+    def lookup_int(self, version: int, address: int) -> Optional[str]:
+        block = self.sets[version].containing_block(address)
+        return None if block is None else format_cidr(version, *block)
+
+
+class PrefixRegistryFull(Exception):
+    """Raised when storing a prefix list would go over the list or prefix limits."""
+
+
+class PrefixRegistry:
+    """Named prefix indexes shared by all requests of a worker (each gunicorn worker has its own)."""
+
+    def __init__(self, limit: int = PREFIX_LIST_LIMIT, max_prefixes: int = PREFIX_LIST_MAX_PREFIXES):
+        self.limit = limit
+        self.max_prefixes = max_prefixes
+        self.indexes: Dict[str, PrefixIndex] = {}
+        self.lock = threading.Lock()
+
+    def get(self, name: str) -> Optional[PrefixIndex]:
+        return self.indexes.get(name)
+
+    def put(self, name: str, index: PrefixIndex) -> None:
+        if not LIST_NAME.match(name):
+            raise ValueError(f"Invalid prefix list name: {name}")
+        with self.lock:
+            # A list replaced under the same name no longer counts
+            others = [other for other_name, other in self.indexes.items() if other_name != name]
+            if self.limit and len(others) >= self.limit:
+                raise PrefixRegistryFull(f"At most {self.limit} prefix lists can be stored")
+            if self.max_prefixes and sum(len(other) for other in others) + len(index) > self.max_prefixes:
+                raise PrefixRegistryFull(f"At most {self.max_prefixes} prefixes can be stored over all lists")
+            self.indexes[name] = index
+
+    def remove(self, name: str) -> bool:
+        with self.lock:
+            return self.indexes.pop(name, None) is not None
+
+    def items(self) -> List[Tuple[str, PrefixIndex]]:
+        with self.lock:
+            return sorted(self.indexes.items())
+
+    def load_directory(self, directory: str) -> None:
+        """Load every .txt file of a directory as a prefix list named after the file."""
+        for filename in sorted(os.listdir(directory)):
+            name, extension = os.path.splitext(filename)
+            if extension != '.txt' or not LIST_NAME.match(name):
+                continue
+            with open(os.path.join(directory, filename), encoding='utf-8') as handle:
+                self.put(name, PrefixIndex(line.strip() for line in handle if line.strip()))
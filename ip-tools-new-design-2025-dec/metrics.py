@@ -0,0 +1,124 @@
+"""In-process metrics in the Prometheus text exposition format.
+
+Only histograms and callback values are needed here, so this avoids an extra
+dependency. Each gunicorn worker keeps its own numbers.
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, Tuple
+
+# Request and stage durations, in seconds
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Input sizes (lines, intervals, addresses) in powers of ten, larger ones count as +Inf
+SIZE_BUCKETS = tuple(10 ** exponent for exponent in range(0, 20))
+
+
+def format_labels(names: Tuple[str, ...], values: Tuple[str, ...]) -> str:
+    pairs = []
+    for name, value in zip(names, values):
+        escaped = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{name}="{escaped}"')
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Histogram:
+    """Cumulative histogram with one series per combination of label values."""
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...],
+                 buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = buckets
+        self.series: Dict[Tuple[str, ...], List] = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str) -> None:
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(labels)
+            if series is None:
+                # Per-bucket counts (the last one is +Inf), then the sum
+                series = self.series[labels] = [[0] * (len(self.buckets) + 1), 0]
+            series[0][index] += 1
+            series[1] += value
+
+    @contextmanager
+    def time(self, *labels: str) -> Iterator[None]:
+        """Observe how long the block takes."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def render(self) -> Iterator[str]:
+        yield f'# HELP {self.name} {self.documentation}'
+        yield f'# TYPE {self.name} histogram'
+        with self.lock:
+            series = [(labels, list(counts), total) for labels, (counts, total) in sorted(self.series.items())]
+        for labels, counts, total in series:
+            cumulative = 0
+            bounds = [repr(float(bound)) for bound in self.buckets] + ['+Inf']
+            for bound, count in zip(bounds, counts):
+                cumulative += count
+                bucket_labels = format_labels(self.labelnames + ('le',), labels + (bound,))
+                yield f'{self.name}_bucket{bucket_labels} {cumulative}'
+            yield f'{self.name}_sum{format_labels(self.labelnames, labels)} {total}'
+            yield f'{self.name}_count{format_labels(self.labelnames, labels)} {cumulative}'
+
+
+class CallbackMetric:
+    """Counter or gauge whose values are read from a function at scrape time."""
+
+    def __init__(self, name: str, documentation: str, kind: str, labelnames: Tuple[str, ...],
+                 collect: Callable[[], Iterable[Tuple[Tuple[str, ...], float]]]):
+        self.name = name
+        self.documentation = documentation
+        self.kind = kind
+        self.labelnames = labelnames
+        self.collect = collect
+
+    def render(self) -> Iterator[str]:
+        yield f'# HELP {self.name} {self.documentation}'
+        yield f'# TYPE {self.name} {self.kind}'
+        for labels, value in self.collect():
+            yield f'{self.name}{format_labels(self.labelnames, labels)} {value}'
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics: List = []
+
+    def histogram(self, name: str, documentation: str, labelnames: Tuple[str, ...],
+                  buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> Histogram:
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self.metrics.append(metric)
+        return metric
+
+    def callback(self, name: str, documentation: str, kind: str, labelnames: Tuple[str, ...],
+                 collect: Callable[[], Iterable[Tuple[Tuple[str, ...], float]]]) -> CallbackMetric:
+        metric = CallbackMetric(name, documentation, kind, labelnames, collect)
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        return '\n'.join(line for metric in self.metrics for line in metric.render()) + '\n'
+
+
+registry = MetricsRegistry()
+
+REQUEST_SECONDS = registry.histogram(
+    'ip_tools_request_duration_seconds', 'Time to build the response of a request.',
+    ('method', 'route', 'status'))
+
+INPUT_SIZE = registry.histogram(
+    'ip_tools_input_size', 'Size of calculation inputs and results (lines, intervals, addresses).',
+    ('route', 'measure'), SIZE_BUCKETS)
+
+STAGE_SECONDS = registry.histogram(
+    'ip_tools_stage_duration_seconds', 'Time spent in each stage of the calculation pipelines.',
+    ('pipeline', 'stage'))
@@ -0,0 +1,147 @@
+import heapq
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple, Union
+
+from cidrmath import ADDRESS_BITS, parse_cidr, prefix_bounds, format_cidr, range_to_cidrs
+from intervals import IntervalSet
+
+
+class SubnetRequest(NamedTuple):
+    index: int
+    name: Optional[str]
+    requested: Union[int, str]
+    prefixlen: int
+
+
+def prefix_for_hosts(version: int, hosts: int) -> int:
+    """Return the longest prefix length with at least `hosts` usable addresses.
+
+    Usable addresses are counted as in the subnet calculator: IPv4 prefixes
+    lose the network and broadcast address except /31 and /32, IPv6 ones do not.
+    """
+    bits = ADDRESS_BITS[version]
+    if hosts < 1:
+        raise ValueError('Host count must be at least 1')
+    if version == 6:
+        host_bits = (hosts - 1).bit_length()
+    elif hosts <= 2:
+        host_bits = hosts - 1
+    else:
+        host_bits = (hosts + 1).bit_length()
+    if host_bits > bits:
+        raise ValueError(f"{hosts} hosts do not fit in an IPv{version} prefix")
+    return bits - host_bits
+
+
+def parse_subnet_request(version: int, index: int, item) -> SubnetRequest:
+    """Turn a requested size into a prefix length.
+
+    Accepts a host count (50), a prefix length ("/26"), or an object with a
+    "name" and either "hosts" or "prefixlen". Raises ValueError otherwise.
+    """
+    name = None
+    if isinstance(item, dict):
+        name = item.get('name')
+        if 'prefixlen' in item:
+            item = f"/{item['prefixlen']}"
+        else:
+            item = item.get('hosts')
+
+    if isinstance(item, str) and item.strip().startswith('/'):
+        text = item.strip()[1:]
+        if not text.isdigit() or int(text) > ADDRESS_BITS[version]:
+            raise ValueError(f"Invalid prefix length: {item}")
+        return SubnetRequest(index, name, item.strip(), int(text))
+    if isinstance(item, bool) or not isinstance(item, int):
+        raise ValueError('Each request must be a host count or a prefix length like "/24"')
+    return SubnetRequest(index, name, item, prefix_for_hosts(version, item))
+
+
+class SubnetAllocator:
+    """Buddy allocator handing out aligned prefixes from free blocks.
+
+    Free space is kept as one min-heap of block addresses per prefix length.
+    An allocation takes the lowest block of the longest free prefix length that
+    still fits (best fit) and splits it down, returning the unused buddy halves
+    to the free lists, so its cost depends on the address width, not on how
+    much space is free or allocated.
+    """
+
+    def __init__(self, version: int, free_blocks: Iterable[Tuple[int, int]] = ()):
+        self.version = version
+        self.bits = ADDRESS_BITS[version]
+        self.free: Dict[int, List[int]] = {}
+        for network, prefixlen in free_blocks:
+            heapq.heappush(self.free.setdefault(prefixlen, []), network)
+
+    @classmethod
+    def from_interval_set(cls, interval_set: IntervalSet) -> 'SubnetAllocator':
+        """Start from the free address ranges of a set, split into aligned blocks."""
+        bits = ADDRESS_BITS[interval_set.version]
+        return cls(interval_set.version, (block for start, end in interval_set
+                                          for block in range_to_cidrs(start, end, bits)))
+
+    def allocate(self, prefixlen: int) -> Optional[int]:
+        """Return the network address of a newly allocated prefix, or None if none is free."""
+        for length in range(prefixlen, -1, -1):
+            if self.free.get(length):
+                break
+        else:
+            return None
+
+        network = heapq.heappop(self.free[length])
+        while length < prefixlen:
+            length += 1
+            buddy = network + (1 << (self.bits - length))
+            heapq.heappush(self.free.setdefault(length, []), buddy)
+        return network
+
+    def free_set(self) -> IntervalSet:
+        """Return the remaining free space, with split buddies merged back together."""
+        return IntervalSet.from_intervals(self.version, (
+            (network, network + (1 << (self.bits - prefixlen)) - 1)
+            for prefixlen, networks in self.free.items() for network in networks))
+
+
+def plan_subnets(parent: str, requests: List, allocated: Iterable[str] = ()) -> dict:
+    """Assign prefixes for the requested sizes inside a parent block.
+
+    Existing allocations are left out of the free space first. Requests are
+    placed largest first, which packs power-of-two blocks without gaps, and
+    are reported in their original order. Raises ValueError for invalid input.
+    """
+    version, address, prefixlen = parse_cidr(parent)
+    start, end = prefix_bounds(version, address, prefixlen)
+
+    used = []
+    for cidr in allocated:
+        used_version, used_address, used_prefixlen = parse_cidr(cidr)
+        used_start, used_end = prefix_bounds(used_version, used_address, used_prefixlen)
+        if used_version != version or used_start < start or used_end > end:
+            raise ValueError(f"Allocation {cidr} is not inside {parent}")
+        used.append((used_start, used_end))
+
+    wanted = [parse_subnet_request(version, index, item) for index, item in enumerate(requests)]
+
+    free = IntervalSet(version, [(start, end)]).difference(IntervalSet.from_intervals(version, used))
+    allocator = SubnetAllocator.from_interval_set(free)
+
+    results: List[Optional[dict]] = [None] * len(wanted)
+    for subnet in sorted(wanted, key=lambda subnet: (subnet.prefixlen, subnet.index)):
+        result = {'name': subnet.name, 'requested': subnet.requested, 'prefixlen': subnet.prefixlen}
+        network = allocator.allocate(subnet.prefixlen)
+        if network is None:
+            result['cidr'] = None
+            result['error'] = 'Not enough free space'
+        else:
+            result['cidr'] = format_cidr(version, network, subnet.prefixlen)
+        results[subnet.index] = result
+
+    remaining = allocator.free_set()
+    return {
+        'parent': format_cidr(version, start, prefixlen),
+        'allocations': results,
+        'allocated_count': sum(1 for result in results if result['cidr']),
+        'failed_count': sum(1 for result in results if not result['cidr']),
+        'free': list(remaining.iter_cidrs()),
+        'free_addresses': remaining.num_addresses
+    }
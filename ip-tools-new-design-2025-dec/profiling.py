@@ -0,0 +1,121 @@
+import cProfile
+import hmac
+import io
+import ipaddress
+import os
+import pstats
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional
+
+# Secret that allows profiling a request through the X-Profile-Token header
+PROFILE_TOKEN = os.environ.get('IP_TOOLS_PROFILE_TOKEN', '')
+
+# Client addresses or networks (comma separated) that may profile requests without the token
+PROFILE_ALLOW = [ipaddress.ip_network(network.strip(), strict=False)
+                 for network in os.environ.get('IP_TOOLS_PROFILE_ALLOW', '').split(',') if network.strip()]
+
+# Directory where raw .prof files are written for pstats/snakeviz, if set
+PROFILE_DIR = os.environ.get('IP_TOOLS_PROFILE_DIR', '')
+
+# Profile summaries kept in memory, and functions listed in each
+PROFILE_LIMIT = 16
+PROFILE_TOP_FUNCTIONS = 40
+
+
+def profiling_allowed(client: Optional[str], token: Optional[str]) -> bool:
+    """Check the admin token, or else the client address against the allow list.
+
+    The client address is the one resolved from X-Real-IP behind a trusted
+    proxy, not the proxy's own address.
+    """
+    if PROFILE_TOKEN and token:
+        return hmac.compare_digest(token.encode(), PROFILE_TOKEN.encode())
+    if not PROFILE_ALLOW or not client:
+        return False
+    try:
+        address = ipaddress.ip_address(client)
+    except ValueError:
+        return False
+    return any(address in network for network in PROFILE_ALLOW)
+
+
+def summarize_profile(profiler: cProfile.Profile, sort: str = 'cumulative',
+                      limit: int = PROFILE_TOP_FUNCTIONS) -> str:
+    """Render the hottest functions of a finished profile as pstats text."""
+    output = io.StringIO()
+    stats = pstats.Stats(profiler, stream=output)
+    stats.strip_dirs().sort_stats(sort).print_stats(limit)
+    return output.getvalue()
+
+
+class RequestProfile:
+    """A deterministic profile of a single request."""
+
+    def __init__(self, method: str, path: str):
+        self.id = secrets.token_urlsafe(12)
+        self.method = method
+        self.path = path
+        self.created = time.time()
+        self.duration: Optional[float] = None
+        self.summary: Optional[str] = None
+        self.profiler = cProfile.Profile()
+        self.start = time.perf_counter()
+
+    def to_dict(self) -> dict:
+        return {
+            'id': self.id,
+            'method': self.method,
+            'path': self.path,
+            'created': self.created,
+            'duration': self.duration,
+            'summary': self.summary
+        }
+
+
+class ProfileStore:
+    """Runs at most one profiled request at a time and keeps the latest summaries."""
+
+    def __init__(self, limit: int = PROFILE_LIMIT, directory: str = PROFILE_DIR):
+        self.limit = limit
+        self.directory = directory
+        self.profiles: 'OrderedDict[str, RequestProfile]' = OrderedDict()
+        self.lock = threading.Lock()
+        # The interpreter supports a single active profiler
+        self.running = threading.Lock()
+
+    def start(self, method: str, path: str) -> Optional[RequestProfile]:
+        """Start profiling the current request, or return None if another one is being profiled."""
+        if not self.running.acquire(blocking=False):
+            return None
+        profile = RequestProfile(method, path)
+        profile.profiler.enable()
+        return profile
+
+    def finish(self, profile: RequestProfile) -> None:
+        """Stop the profiler, summarize it and store the summary (and the raw profile file)."""
+        try:
+            profile.profiler.disable()
+        finally:
+            self.running.release()
+        profile.duration = time.perf_counter() - profile.start
+        profile.summary = summarize_profile(profile.profiler)
+        if self.directory:
+            profile.profiler.dump_stats(os.path.join(self.directory, f"{profile.id}.prof"))
+        # The raw profiler data is no longer needed once summarized
+        profile.profiler = None
+
+        with self.lock:
+            self.profiles[profile.id] = profile
+            while len(self.profiles) > self.limit:
+                self.profiles.popitem(last=False)
+
+    def get(self, profile_id: str) -> Optional[RequestProfile]:
+        with self.lock:
+            return self.profiles.get(profile_id)
+
+    def items(self) -> List[RequestProfile]:
+        with self.lock:
+            return list(self.profiles.values())
@@ -0,0 +1,133 @@
+"""Binary snapshots of consolidated prefix sets.
+
+A snapshot stores the sorted, merged intervals of an IntervalSet per IP
+version as little-endian uint64 columns:
+
+    magic       8 bytes   b'IPTSET01'
+    v4_count    uint64
+    v6_count    uint64
+    v4 starts, v4 ends                                   v4_count values each
+    v6 starts high/low, v6 ends high/low (64-bit halves)  v6_count values each
+
+Loading maps the file read-only and wraps the columns in memoryviews, so no
+data is copied and every gunicorn worker shares the same page cache pages.
+"""
+import mmap
+import os
+import struct
+import sys
+import threading
+from array import array
+from typing import BinaryIO, Dict, Iterator, List, Tuple
+
+from intervals import IntervalSet, WideArray
+from lookup import LIST_NAME
+
+MAGIC = b'IPTSET01'
+HEADER = struct.Struct('<8sQQ')
+
+# File extension of snapshots loaded from IP_TOOLS_SNAPSHOT_DIR
+SNAPSHOT_EXTENSION = '.ipset'
+
+
+def little_endian_bytes(values: array) -> bytes:
+    if sys.byteorder == 'little':
+        return values.tobytes()
+    swapped = array('Q', values)
+    swapped.byteswap()
+    return swapped.tobytes()
+
+
+def iter_snapshot_chunks(sets: Dict[int, IntervalSet]) -> Iterator[bytes]:
+    """Yield the binary snapshot of the IPv4 and IPv6 interval sets piece by piece."""
+    v4, v6 = sets[4], sets[6]
+    yield HEADER.pack(MAGIC, len(v4), len(v6))
+    for column in (v4.starts, v4.ends):
+        yield little_endian_bytes(array('Q', column))
+    for column in (v6.starts, v6.ends):
+        yield little_endian_bytes(array('Q', column.high))
+        yield little_endian_bytes(array('Q', column.low))
+
+
+def write_snapshot(handle: BinaryIO, sets: Dict[int, IntervalSet]) -> None:
+    """Write the IPv4 and IPv6 interval sets to a binary snapshot file."""
+    for chunk in iter_snapshot_chunks(sets):
+        handle.write(chunk)
+
+
+def read_snapshot(buffer) -> Dict[int, IntervalSet]:
+    """Wrap a snapshot buffer (bytes or mmap) in interval sets without copying it.
+
+    Raises ValueError if the buffer is not a valid snapshot.
+    """
+    if len(buffer) < HEADER.size:
+        raise ValueError('Snapshot is too short')
+    magic, v4_count, v6_count = HEADER.unpack_from(buffer)
+    if magic != MAGIC:
+        raise ValueError('Not an IP set snapshot')
+    if len(buffer) != HEADER.size + 8 * (2 * v4_count + 4 * v6_count):
+        raise ValueError('Snapshot size does not match its header')
+
+    view = memoryview(buffer)[HEADER.size:]
+
+    def column(count: int) -> memoryview:
+        nonlocal view
+        values, view = view[:8 * count], view[8 * count:]
+        if sys.byteorder == 'little':
+            return values.cast('Q')
+        # Big-endian hosts cannot use the file layout directly
+        swapped = array('Q', values.tobytes())
+        swapped.byteswap()
+        return memoryview(swapped)
+
+    v4 = IntervalSet(4)
+    v4.starts = column(v4_count)
+    v4.ends = column(v4_count)
+
+    v6 = IntervalSet(6)
+    for attribute in ('starts', 'ends'):
+        wide = WideArray()
+        wide.high = column(v6_count)
+        wide.low = column(v6_count)
+        setattr(v6, attribute, wide)
+
+    return {4: v4, 6: v6}
+
+
+def load_snapshot(path: str) -> Dict[int, IntervalSet]:
+    """Memory-map a snapshot file read-only and return its interval sets."""
+    with open(path, 'rb') as handle:
+        if os.fstat(handle.fileno()).st_size == 0:
+            raise ValueError('Snapshot is empty')
+        # The mapping stays valid after the file is closed
+        mapped = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+    return read_snapshot(mapped)
+
+
+class SnapshotRegistry:
+    """Named, memory-mapped prefix sets usable by consolidate, complement and lookup."""
+
+    def __init__(self):
+        self.sets: Dict[str, Dict[int, IntervalSet]] = {}
+        self.lock = threading.Lock()
+
+    def get(self, name: str) -> Dict[int, IntervalSet]:
+        """Return the interval sets of a snapshot, raising KeyError if it is unknown."""
+        try:
+            return self.sets[name]
+        except KeyError:
+            raise KeyError(f"Unknown prefix set: {name}") from None
+
+    def items(self) -> List[Tuple[str, Dict[int, IntervalSet]]]:
+        with self.lock:
+            return sorted(self.sets.items())
+
+    def load_directory(self, directory: str) -> None:
+        """Map every snapshot file of a directory, named after the file."""
+        for filename in sorted(os.listdir(directory)):
+            name, extension = os.path.splitext(filename)
+            if extension != SNAPSHOT_EXTENSION or not LIST_NAME.match(name):
+                continue
+            sets = load_snapshot(os.path.join(directory, filename))
+            with self.lock:
+                self.sets[name] = sets
@@ -0,0 +1,199 @@
+"""Special-purpose address classification from the IANA registries.
+
+The IPv4 and IPv6 special-purpose address registries (RFC 6890) and the
+multicast scopes are flattened once into sorted, disjoint ranges, so
+classifying an address is a single bisect instead of a scan of networks.
+"""
+from array import array
+from bisect import bisect_right
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from cidrmath import ADDRESS_BITS, parse_cidr, prefix_bounds
+from lookup import NO_PREFIX, AddressLookup, flatten_prefixes
+
+
+class SpecialRange(NamedTuple):
+    prefix: str
+    name: str
+    rfc: str
+    # "Globally Reachable" column of the registry, None where it does not apply
+    globally_reachable: Optional[bool]
+
+    def to_dict(self) -> dict:
+        return self._asdict()
+
+
+# iana-ipv4-special-registry, plus the multicast blocks of RFC 5771 and RFC 2365
+IPV4_SPECIAL = (
+    SpecialRange('0.0.0.0/8', 'This network', 'RFC 791', False),
+    SpecialRange('0.0.0.0/32', 'This host on this network', 'RFC 1122', False),
+    SpecialRange('10.0.0.0/8', 'Private-Use', 'RFC 1918', False),
+    SpecialRange('100.64.0.0/10', 'Shared Address Space (CGNAT)', 'RFC 6598', False),
+    SpecialRange('127.0.0.0/8', 'Loopback', 'RFC 1122', False),
+    SpecialRange('169.254.0.0/16', 'Link Local', 'RFC 3927', False),
+    SpecialRange('172.16.0.0/12', 'Private-Use', 'RFC 1918', False),
+    SpecialRange('192.0.0.0/24', 'IETF Protocol Assignments', 'RFC 6890', False),
+    SpecialRange('192.0.0.0/29', 'IPv4 Service Continuity Prefix', 'RFC 7335', False),
+    SpecialRange('192.0.0.8/32', 'IPv4 dummy address', 'RFC 7600', False),
+    SpecialRange('192.0.0.9/32', 'Port Control Protocol Anycast', 'RFC 7723', True),
+    SpecialRange('192.0.0.10/32', 'Traversal Using Relays around NAT Anycast', 'RFC 8155', True),
+    SpecialRange('192.0.0.170/31', 'NAT64/DNS64 Discovery', 'RFC 8880', False),
+    SpecialRange('192.0.2.0/24', 'Documentation (TEST-NET-1)', 'RFC 5737', False),
+    SpecialRange('192.31.196.0/24', 'AS112-v4', 'RFC 7535', True),
+    SpecialRange('192.52.193.0/24', 'AMT', 'RFC 7450', True),
+    SpecialRange('192.88.99.0/24', 'Deprecated (6to4 Relay Anycast)', 'RFC 7526', None),
+    SpecialRange('192.168.0.0/16', 'Private-Use', 'RFC 1918', False),
+    SpecialRange('192.175.48.0/24', 'Direct Delegation AS112 Service', 'RFC 7534', True),
+    SpecialRange('198.18.0.0/15', 'Benchmarking', 'RFC 2544', False),
+    SpecialRange('198.51.100.0/24', 'Documentation (TEST-NET-2)', 'RFC 5737', False),
+    SpecialRange('203.0.113.0/24', 'Documentation (TEST-NET-3)', 'RFC 5737', False),
+    SpecialRange('224.0.0.0/4', 'Multicast', 'RFC 5771', None),
+    SpecialRange('224.0.0.0/24', 'Multicast, Local Network Control Block', 'RFC 5771', None),
+    SpecialRange('224.0.1.0/24', 'Multicast, Internetwork Control Block', 'RFC 5771', None),
+    SpecialRange('232.0.0.0/8', 'Multicast, Source-Specific', 'RFC 4607', None),
+    SpecialRange('233.0.0.0/16', 'Multicast, GLOP Block', 'RFC 3180', None),
+    SpecialRange('233.252.0.0/24', 'Multicast, Documentation (MCAST-TEST-NET)', 'RFC 6676', None),
+    SpecialRange('234.0.0.0/8', 'Multicast, Unicast-Prefix-based', 'RFC 6034', None),
+    SpecialRange('239.0.0.0/8', 'Multicast, Administratively Scoped', 'RFC 2365', None),
+    SpecialRange('239.192.0.0/14', 'Multicast, Organization-Local Scope', 'RFC 2365', None),
+    SpecialRange('239.255.0.0/16', 'Multicast, Local Scope', 'RFC 2365', None),
+    SpecialRange('240.0.0.0/4', 'Reserved', 'RFC 1112', False),
+    SpecialRange('255.255.255.255/32', 'Limited Broadcast', 'RFC 919', False),
+)
+
+# Scopes of IPv6 multicast addresses (RFC 4291, RFC 7346), the last 4 bits of the second byte
+IPV6_MULTICAST_SCOPES = {
+    0x1: 'Interface-Local',
+    0x2: 'Link-Local',
+    0x3: 'Realm-Local',
+    0x4: 'Admin-Local',
+    0x5: 'Site-Local',
+    0x8: 'Organization-Local',
+    0xe: 'Global',
+}
+
+# iana-ipv6-special-registry, plus the multicast scopes for every combination of flags
+IPV6_SPECIAL = (
+    SpecialRange('::/128', 'Unspecified Address', 'RFC 4291', False),
+    SpecialRange('::1/128', 'Loopback Address', 'RFC 4291', False),
+    SpecialRange('::ffff:0:0/96', 'IPv4-mapped Address', 'RFC 4291', False),
+    SpecialRange('64:ff9b::/96', 'IPv4-IPv6 Translation', 'RFC 6052', True),
+    SpecialRange('64:ff9b:1::/48', 'Local-Use IPv4/IPv6 Translation', 'RFC 8215', False),
+    SpecialRange('100::/64', 'Discard-Only Address Block', 'RFC 6666', False),
+    SpecialRange('2001::/23', 'IETF Protocol Assignments', 'RFC 2928', False),
+    SpecialRange('2001::/32', 'TEREDO', 'RFC 4380', None),
+    SpecialRange('2001:1::1/128', 'Port Control Protocol Anycast', 'RFC 7723', True),
+    SpecialRange('2001:1::2/128', 'Traversal Using Relays around NAT Anycast', 'RFC 8155', True),
+    SpecialRange('2001:1::3/128', 'DNS-SD Service Registration Protocol Anycast', 'RFC 9665', True),
+    SpecialRange('2001:2::/48', 'Benchmarking', 'RFC 5180', False),
+    SpecialRange('2001:3::/32', 'AMT', 'RFC 7450', True),
+    SpecialRange('2001:4:112::/48', 'AS112-v6', 'RFC 7535', True),
+    SpecialRange('2001:10::/28', 'Deprecated (previously ORCHID)', 'RFC 4843', None),
+    SpecialRange('2001:20::/28', 'ORCHIDv2', 'RFC 7343', True),
+    SpecialRange('2001:30::/28', 'Drone Remote ID Protocol Entity Tags (DETs) Prefix', 'RFC 9374', True),
+    SpecialRange('2001:db8::/32', 'Documentation', 'RFC 3849', False),
+    SpecialRange('2002::/16', '6to4', 'RFC 3056', None),
+    SpecialRange('2620:4f:8000::/48', 'Direct Delegation AS112 Service', 'RFC 7534', True),
+    SpecialRange('3fff::/20', 'Documentation', 'RFC 9637', False),
+    SpecialRange('5f00::/16', 'Segment Routing (SRv6) SIDs', 'RFC 9602', False),
+    SpecialRange('fc00::/7', 'Unique-Local', 'RFC 4193', False),
+    SpecialRange('fe80::/10', 'Link-Local Unicast', 'RFC 4291', False),
+    SpecialRange('ff00::/8', 'Multicast', 'RFC 4291', None),
+) + tuple(
+    SpecialRange(f'ff{flags:x}{scope:x}::/16', f'Multicast, {name} Scope', 'RFC 7346', None)
+    for scope, name in IPV6_MULTICAST_SCOPES.items() for flags in range(16)
+)
+
+# First octet at which each classful IPv4 range starts
+CLASS_BOUNDS = ((240, 'E'), (224, 'D'), (192, 'C'), (128, 'B'), (0, 'A'))
+
+# Not globally reachable, but not private either (the rule of Python 3.13's ipaddress.is_private)
+SHARED_ADDRESS_SPACE = '100.64.0.0/10'
+
+
+def address_class(address: int) -> str:
+    """Return the classful (A to E) range of an IPv4 address, from its first octet."""
+    first_octet = address >> 24
+    for bound, name in CLASS_BOUNDS:
+        if first_octet >= bound:
+            return name
+
+
+def is_multicast(version: int, address: int) -> bool:
+    if version == 4:
+        return address >> 28 == 0xe
+    return address >> 120 == 0xff
+
+
+class SpecialPurposeIndex(AddressLookup):
+    """Most specific special-purpose range of an address, as a single bisect."""
+
+    def __init__(self, ranges: Iterable[SpecialRange]):
+        self.ranges: List[SpecialRange] = list(ranges)
+        prefixes: Dict[int, List[Tuple[int, int, int]]] = {4: [], 6: []}
+        for label, special in enumerate(self.ranges):
+            version, address, prefixlen = parse_cidr(special.prefix)
+            start, end = prefix_bounds(version, address, prefixlen)
+            prefixes[version].append((start, end, label))
+
+        self.starts: Dict[int, object] = {}
+        self.labels: Dict[int, array] = {}
+        for version in (4, 6):
+            starts, labels = flatten_prefixes(prefixes[version])
+            self.starts[version] = array('Q', starts) if version == 4 else starts
+            self.labels[version] = array('l', labels)
+
+        # Private flag of every range, looked up with the same label
+        self.private = [special.globally_reachable is False and special.prefix != SHARED_ADDRESS_SPACE
+                        for special in self.ranges]
+
+    def label_of(self, version: int, address: int) -> int:
+        """Return the index of the most specific range containing an address, or NO_PREFIX."""
+        return self.labels[version][bisect_right(self.starts[version], address) - 1]
+
+    def range_of(self, version: int, address: int) -> Optional[SpecialRange]:
+        """Return the most specific special-purpose range containing an integer address, if any."""
+        label = self.label_of(version, address)
+        return None if label == NO_PREFIX else self.ranges[label]
+
+    def lookup_int(self, version: int, address: int) -> Optional[str]:
+        special = self.range_of(version, address)
+        return None if special is None else special.prefix
+
+    def is_private(self, version: int, address: int) -> bool:
+        """Check whether an address is in a block that is not globally reachable."""
+        label = self.label_of(version, address)
+        return label != NO_PREFIX and self.private[label]
+
+    def classify(self, version: int, address: int) -> dict:
+        label = self.label_of(version, address)
+        special = None if label == NO_PREFIX else self.ranges[label]
+        result = {'version': version}
+        if version == 4:
+            result['class'] = address_class(address)
+        result.update({
+            'special': None if special is None else special.to_dict(),
+            'private': special is not None and self.private[label],
+            'multicast': is_multicast(version, address),
+            'globally_reachable': True if special is None else special.globally_reachable
+        })
+        return result
+
+    def classify_many(self, ips: Iterable[str]) -> List[dict]:
+        """Classify many IP addresses, with an error entry for the invalid ones."""
+        results = []
+        for ip in ips:
+            try:
+                version, address, prefixlen = parse_cidr(ip)
+            except (ValueError, AttributeError):
+                results.append({'ip': ip, 'error': 'Invalid IP address'})
+                continue
+            if prefixlen != ADDRESS_BITS[version]:
+                results.append({'ip': ip, 'error': 'Not a single IP address'})
+                continue
+            results.append({'ip': ip, **self.classify(version, address)})
+        return results
+
+
+# Index of all special-purpose ranges, built once at import
+SPECIAL_PURPOSE = SpecialPurposeIndex(IPV4_SPECIAL + IPV6_SPECIAL)
@@ -0,0 +1,97 @@
+"""Longest-prefix match must agree with a brute-force scan of the prefixes."""
+import ipaddress
+import random
+
+import pytest
+
+from lookup import NO_PREFIX, PrefixIndex, PrefixRegistry, PrefixRegistryFull, flatten_prefixes
+
+
+def brute_force(networks, ip):
+    address = ipaddress.ip_address(ip)
+    matches = [network for network in networks if address in network]
+    return str(max(matches, key=lambda network: network.prefixlen)) if matches else None
+
+
+def probe_addresses(networks, rng, extra=200):
+    """Both ends of every prefix and the addresses just outside them, plus random ones."""
+    probes = set()
+    for network in networks:
+        first, last = int(network.network_address), int(network.broadcast_address)
+        top = (1 << network.max_prefixlen) - 1
+        for value in (first - 1, first, last, last + 1):
+            if 0 <= value <= top:
+                probes.add(str(type(network.network_address)(value)))
+    probes.update(str(ipaddress.IPv4Address(rng.randrange(1 << 32))) for _ in range(extra))
+    probes.update(str(ipaddress.IPv6Address(rng.randrange(1 << 128))) for _ in range(extra))
+    return sorted(probes)
+
+
+def random_nested_prefixes(rng, count):
+    """Random prefixes, many of them nested inside earlier ones."""
+    prefixes = []
+    for _ in range(count):
+        if prefixes and rng.random() < 0.6:
+            parent = ipaddress.ip_network(rng.choice(prefixes))
+            if parent.prefixlen < parent.max_prefixlen:
+                prefixlen = rng.randrange(parent.prefixlen + 1, parent.max_prefixlen + 1)
+                offset = rng.randrange(1 << (prefixlen - parent.prefixlen))
+                address = int(parent.network_address) + (offset << (parent.max_prefixlen - prefixlen))
+                prefixes.append(str(type(parent)((address, prefixlen))))
+                continue
+        if rng.random() < 0.7:
+            prefixlen = rng.randrange(0, 33)
+            prefixes.append(str(ipaddress.IPv4Network((rng.randrange(1 << 32), prefixlen), strict=False)))
+        else:
+            prefixlen = rng.randrange(0, 129)
+            prefixes.append(str(ipaddress.IPv6Network((rng.randrange(1 << 128), prefixlen), strict=False)))
+    return prefixes
+
+
+FIXED_PREFIXES = [
+    '10.0.0.0/8', '10.1.0.0/16', '10.1.2.0/24', '10.1.2.3/32', '10.1.2.128/25', '10.255.255.255/32',
+    '0.0.0.0/0', '0.0.0.0/32', '255.255.255.255/32', '192.168.0.0/16', '192.168.0.0/24', '192.168.0.0/16',
+    '2001:db8::/32', '2001:db8::/48', '2001:db8:0:1::/64', '::/0', 'ffff:ffff:ffff:ffff:ffff:ffff:ffff:ffff/128',
+]
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_lookup_matches_brute_force(seed):
+    rng = random.Random(seed)
+    prefixes = random_nested_prefixes(rng, 60) if seed else FIXED_PREFIXES
+    networks = [ipaddress.ip_network(prefix) for prefix in prefixes]
+    index = PrefixIndex(prefixes + ['not a prefix'])
+    assert index.invalid == 1
+    for ip in probe_addresses(networks, rng):
+        assert index.lookup(ip) == brute_force(networks, ip), ip
+
+
+def test_lookup_many_reports_bad_input():
+    index = PrefixIndex(['10.0.0.0/8'])
+    assert index.lookup_many(['10.1.1.1', '11.0.0.1', 'bad', '10.0.0.0/24']) == [
+        ('10.1.1.1', '10.0.0.0/8', None),
+        ('11.0.0.1', None, None),
+        ('bad', None, 'Invalid IP address'),
+        ('10.0.0.0/24', None, 'Not a single IP address'),
+    ]
+
+
+def test_flatten_prefixes_ranges_are_disjoint():
+    starts, labels = flatten_prefixes([(0, 255, 0), (16, 31, 1), (16, 19, 2), (32, 47, 3), (300, 300, 4)])
+    assert starts == [0, 16, 20, 32, 48, 256, 300, 301]
+    assert labels == [0, 2, 1, 3, 0, NO_PREFIX, 4, NO_PREFIX]
+
+
+def test_registry_limits():
+    registry = PrefixRegistry(limit=2, max_prefixes=3)
+    registry.put('a', PrefixIndex(['10.0.0.0/8']))
+    registry.put('b', PrefixIndex(['11.0.0.0/8']))
+    with pytest.raises(PrefixRegistryFull):
+        registry.put('c', PrefixIndex(['12.0.0.0/8']))
+    with pytest.raises(PrefixRegistryFull):
+        registry.put('b', PrefixIndex(['11.0.0.0/8', '13.0.0.0/8', '14.0.0.0/8']))
+    # Replacing a list only counts its new prefixes
+    registry.put('b', PrefixIndex(['11.0.0.0/8', '13.0.0.0/8']))
+    assert [name for name, _ in registry.items()] == ['a', 'b']
+    with pytest.raises(ValueError):
+        registry.put('../x', PrefixIndex(['10.0.0.0/8']))
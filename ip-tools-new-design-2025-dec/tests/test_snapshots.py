@@ -0,0 +1,66 @@
+"""Snapshots must read back as the interval sets they were written from."""
+import io
+
+import pytest
+
+from intervals import parse_interval_sets
+from snapshots import SnapshotRegistry, load_snapshot, read_snapshot, write_snapshot
+
+PREFIXES = ['10.0.0.0/8', '192.168.1.1', '0.0.0.0/32', '255.255.255.255', '172.16.0.0/12',
+            '2001:db8::/32', '::1', 'ffff:ffff:ffff:ffff:ffff:ffff:ffff:ffff', '::/1', 'fe80::/10']
+
+
+def snapshot_bytes(sets):
+    buffer = io.BytesIO()
+    write_snapshot(buffer, sets)
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize('prefixes', [PREFIXES, [], ['10.0.0.0/8'], ['2001:db8::1']])
+def test_roundtrip(prefixes):
+    sets = parse_interval_sets(prefixes)
+    assert read_snapshot(snapshot_bytes(sets)) == sets
+
+
+def test_lookups_on_read_snapshot():
+    loaded = read_snapshot(snapshot_bytes(parse_interval_sets(PREFIXES)))
+    assert loaded[4].find(0x0a010203) == (0x0a000000, 0x0affffff)
+    assert loaded[4].find(0x0b000000) is None
+    assert loaded[6].find(1) == (0, (1 << 127) - 1)
+
+
+def test_loaded_sets_support_set_operations(tmp_path):
+    sets = parse_interval_sets(PREFIXES)
+    path = tmp_path / 'test.ipset'
+    path.write_bytes(snapshot_bytes(sets))
+    loaded = load_snapshot(str(path))
+    for version in (4, 6):
+        assert loaded[version] == sets[version]
+        assert loaded[version].complement() == sets[version].complement()
+        assert list(loaded[version].iter_cidrs()) == list(sets[version].iter_cidrs())
+
+
+def test_registry_loads_snapshot_files(tmp_path):
+    sets = parse_interval_sets(PREFIXES)
+    (tmp_path / 'bogons.ipset').write_bytes(snapshot_bytes(sets))
+    (tmp_path / 'notes.txt').write_text('not a snapshot')
+    registry = SnapshotRegistry()
+    registry.load_directory(str(tmp_path))
+    assert [name for name, _ in registry.items()] == ['bogons']
+    assert registry.get('bogons') == sets
+    with pytest.raises(KeyError):
+        registry.get('missing')
+
+
+@pytest.mark.parametrize('data', [b'', b'IPTSET01', b'NOTASET0' + bytes(16),
+                                  b'IPTSET01' + (1).to_bytes(8, 'little') + bytes(8)])
+def test_invalid_snapshots(data):
+    with pytest.raises(ValueError):
+        read_snapshot(data)
+
+
+def test_empty_file(tmp_path):
+    path = tmp_path / 'empty.ipset'
+    path.write_bytes(b'')
+    with pytest.raises(ValueError):
+        load_snapshot(str(path))
@@ -0,0 +1,71 @@
+"""Streaming upload reading must match reading the whole file at once."""
+import gzip
+import io
+import random
+import time
+
+import pytest
+
+import uploads
+from uploads import iter_upload_chunks, iter_upload_lines
+
+TEXT = ('10.0.0.0/8\r\n  192.168.1.1  \n\n2001:db8::/32\r\n'
+        'ünïcode line\n split\x0bhere\n' + ''.join(f'172.16.{i}.0/24\n' for i in range(200)) + '1.2.3.4')
+
+
+def expected_lines(text):
+    return [line.strip() for line in text.splitlines() if line.strip()]
+
+
+@pytest.mark.parametrize('chunk_size', [1, 3, 7, 64, 65536])
+@pytest.mark.parametrize('compress', [False, True])
+def test_lines_across_chunk_boundaries(monkeypatch, chunk_size, compress):
+    monkeypatch.setattr(uploads, 'CHUNK_SIZE', chunk_size)
+    data = TEXT.encode('utf-8')
+    if compress:
+        data = gzip.compress(data)
+    stream = io.BytesIO(data)
+    assert list(iter_upload_lines(stream)) == expected_lines(TEXT)
+
+
+def test_upload_chunks_default_size_is_used(monkeypatch):
+    # iter_upload_lines reads with the module chunk size, so the test above really splits lines
+    monkeypatch.setattr(uploads, 'CHUNK_SIZE', 5)
+    chunks = list(iter_upload_chunks(io.BytesIO(b'0123456789ab'), uploads.CHUNK_SIZE))
+    assert chunks == [b'01234', b'56789', b'ab']
+
+
+def test_concatenated_gzip_members():
+    data = gzip.compress(b'10.0.0.0/8\n1.0.0') + gzip.compress(b'.0/8\n2.0.0.0/8\n')
+    assert list(iter_upload_lines(io.BytesIO(data))) == ['10.0.0.0/8', '1.0.0.0/8', '2.0.0.0/8']
+
+
+def test_gzip_output_is_bounded_per_chunk():
+    data = gzip.compress(b'1' * (4 * uploads.CHUNK_SIZE))
+    chunks = list(iter_upload_chunks(io.BytesIO(data)))
+    assert max(len(chunk) for chunk in chunks) <= uploads.CHUNK_SIZE
+    assert sum(len(chunk) for chunk in chunks) == 4 * uploads.CHUNK_SIZE
+
+
+def test_overlong_lines_are_dropped(monkeypatch):
+    monkeypatch.setattr(uploads, 'MAX_LINE_LENGTH', 100)
+    text = '10.0.0.0/8\n' + 'x' * 101 + '\n' + 'y' * 100 + '\n1.2.3.4\n' + 'z' * 5000
+    for chunk_size in (1, 7, 64, 65536):
+        monkeypatch.setattr(uploads, 'CHUNK_SIZE', chunk_size)
+        assert list(iter_upload_lines(io.BytesIO(text.encode()))) == ['10.0.0.0/8', 'y' * 100, '1.2.3.4']
+
+
+def test_long_input_without_newlines_is_linear():
+    # Every chunk used to be joined with the whole unfinished line and split again
+    started = time.perf_counter()
+    assert list(iter_upload_lines(io.BytesIO(b'1' * (16 << 20)))) == []
+    assert time.perf_counter() - started < 5
+
+
+def test_random_text_matches_splitlines(monkeypatch):
+    rng = random.Random(4)
+    alphabet = ['1', '.', '/', ' ', '\n', '\r', '\r\n', 'é', '\x85', '\x1c']
+    for _ in range(50):
+        text = ''.join(rng.choice(alphabet) for _ in range(rng.randrange(200)))
+        monkeypatch.setattr(uploads, 'CHUNK_SIZE', rng.randrange(1, 20))
+        assert list(iter_upload_lines(io.BytesIO(text.encode()))) == expected_lines(text)
@@ -0,0 +1,48 @@
+"""The NumPy parser must give the same interval sets as the pure-Python one."""
+import random
+
+import pytest
+
+import vectorized
+from cidrmath import parse_cidr, prefix_bounds
+from intervals import parse_interval_sets
+
+pytest.importorskip('numpy')
+
+# Lines the fast path must reject or hand over to the regular parser
+EDGE_CASES = [
+    '10.0.0.0/8', '192.168.1.1', '0.0.0.0/0', '255.255.255.255/32', '1.2.3.4/32',
+    '01.2.3.4', '1.2.3.04', '1.2.3.00', '0.0.0.0', '10.0.0.0/08', '10.0.0.0/0032', '10.0.0.0/033',
+    '1.2.3.4/', '1.2.3.4/33', '1.2.3.256', '1.2.3', '1.2.3.4.5', '1.2.3.4/24/8', '.1.2.3', '1..2.3',
+    '١.٢.٣.٤', '1.2.3.٤', '10.0.0.0/٨', '1.2.3.4 ', ' 1.2.3.4', '1.2.3.4\r', '1.2.3.4/ 24',
+    '2001:db8::/32', '::1', '::ffff:1.2.3.4', 'fe80::1/64', '2001:db8::1/129',
+    '', 'not an ip', '1234.1.1.1', '1.2.3.4/1000',
+]
+
+
+@pytest.fixture(autouse=True)
+def vector_path(monkeypatch):
+    monkeypatch.setattr(vectorized, 'VECTORIZED', True)
+    monkeypatch.setattr(vectorized, 'VECTOR_MIN_LINES', 0)
+    vectorized.load_numpy()
+
+
+def test_parse_ipv4_batch_matches_parse_cidr():
+    starts, ends, rest = vectorized.parse_ipv4_batch(EDGE_CASES)
+    accepted = [line for line in EDGE_CASES if line not in rest]
+    expected = [prefix_bounds(*parse_cidr(line)) for line in accepted]
+    assert list(zip(starts.tolist(), ends.tolist())) == expected
+
+
+@pytest.mark.parametrize('line', EDGE_CASES)
+def test_single_line(line):
+    assert vectorized.parse_interval_sets_vectorized([line]) == parse_interval_sets([line])
+
+
+def test_mixed_input():
+    rng = random.Random(16)
+    lines = [f'{rng.randrange(256)}.{rng.randrange(256)}.{rng.randrange(256)}.{rng.randrange(256)}'
+             f'/{rng.randrange(8, 33)}' for _ in range(2000)]
+    lines += EDGE_CASES * 3
+    rng.shuffle(lines)
+    assert vectorized.parse_interval_sets_vectorized(lines) == parse_interval_sets(lines)
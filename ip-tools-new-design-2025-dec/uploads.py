@@ -0,0 +1,113 @@
+import codecs
+import zlib
+from itertools import chain
+from typing import BinaryIO, Iterable, Iterator, List, Optional
+
+# Bytes read from the upload (and produced by the decompressor) per step
+CHUNK_SIZE = 64 * 1024
+
+# Longest line kept by iter_upload_lines, anything longer is not an address
+MAX_LINE_LENGTH = 1 << 20
+
+# Every gzip member starts with these two bytes
+GZIP_MAGIC = b'\x1f\x8b'
+
+
+def iter_upload_chunks(stream: BinaryIO, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """Read an uploaded file in chunks, decompressing gzip uploads on the fly."""
+    chunk = stream.read(chunk_size)
+    if not chunk.startswith(GZIP_MAGIC):
+        while chunk:
+            yield chunk
+            chunk = stream.read(chunk_size)
+        return
+
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    while chunk:
+        # Cap each output block so a small compressed chunk cannot expand all at once
+        data = decompressor.decompress(chunk, chunk_size)
+        while data:
+            yield data
+            data = decompressor.decompress(decompressor.unconsumed_tail, chunk_size)
+
+        if decompressor.eof:
+            # Concatenated gzip members are allowed, continue with the next one
+            chunk = decompressor.unused_data
+            decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            if chunk:
+                continue
+        chunk = stream.read(chunk_size)
+
+    tail = decompressor.flush()
+    if tail:
+        yield tail
+
+
+def iter_upload_lines(stream: BinaryIO, encoding: str = 'utf-8') -> Iterator[str]:
+    """Yield the stripped, non-empty lines of an uploaded file without reading it whole.
+
+    Lines longer than MAX_LINE_LENGTH cannot be addresses and are dropped.
+    """
+    decoder = codecs.getincrementaldecoder(encoding)()
+    # Pieces of the line that continues into the next chunk, None once it is too long
+    pending: Optional[List[str]] = []
+    pending_length = 0
+
+    for chunk in chain(iter_upload_chunks(stream), [None]):
+        text = decoder.decode(b'', final=True) if chunk is None else decoder.decode(chunk)
+        # Only the new text is split; its last piece may continue in the next chunk
+        lines = text.splitlines(keepends=True)
+        tail = lines.pop() if chunk is not None and lines and lines[-1].splitlines()[0] == lines[-1] else ''
+
+        for line in lines:
+            if pending:
+                line = ''.join(pending) + line
+            elif pending is None:
+                line = ''
+            pending = []
+            pending_length = 0
+            # The length limit applies to the line without its line break
+            if len(line) > MAX_LINE_LENGTH and len(line.splitlines()[0]) > MAX_LINE_LENGTH:
+                continue
+            line = line.strip()
+            if line:
+                yield line
+
+        if tail and pending is not None:
+            pending_length += len(tail)
+            if pending_length <= MAX_LINE_LENGTH:
+                pending.append(tail)
+            else:
+                pending = None
+
+    if pending:
+        line = ''.join(pending).strip()
+        if line:
+            yield line
+
+
+def iter_text_lines(items: Iterable[str], batch_size: int = 1000) -> Iterator[str]:
+    """Join items with newlines, yielding the text in batches for a streamed response."""
+    batch = []
+    separator = ''
+    for item in items:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield separator + '\n'.join(batch)
+            separator = '\n'
+            batch = []
+    if batch:
+        yield separator + '\n'.join(batch)
+
+
+class LineCounter:
+    """Iterate over lines while counting how many were seen."""
+
+    def __init__(self, lines: Iterable[str]):
+        self.lines = lines
+        self.count = 0
+
+    def __iter__(self) -> Iterator[str]:
+        for line in self.lines:
+            self.count += 1
+            yield line
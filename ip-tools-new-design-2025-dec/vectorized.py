@@ -0,0 +1,145 @@
+"""Optional NumPy backend for parsing large IPv4 inputs.
+
+Plain a.b.c.d[/nn] lines are parsed, sorted and merged as whole arrays. Every
+other line (IPv6, unusual notations, invalid input) goes through the regular
+pure-Python parser, so the result is identical with or without NumPy.
+"""
+import importlib.util
+import os
+from itertools import chain, islice
+from typing import Dict, Iterable, List, Tuple
+
+from intervals import IntervalSet, parse_interval_sets
+
+# Use NumPy when it is installed, unless disabled with IP_TOOLS_NUMPY=0
+VECTORIZED = importlib.util.find_spec('numpy') is not None and os.environ.get('IP_TOOLS_NUMPY', '1') != '0'
+
+# NumPy is only imported by load_numpy(), the first large input pays for it
+np = None
+
+# Lines converted to one byte buffer at once
+VECTOR_BATCH_LINES = 1 << 18
+
+# Smaller inputs are parsed faster without the array setup
+VECTOR_MIN_LINES = 10_000
+
+
+def load_numpy():
+    """Import NumPy on first use, which keeps app and CLI startup fast."""
+    global np
+    if np is None:
+        import numpy
+        np = numpy
+    return np
+
+
+def parse_ipv4_batch(lines: List[str]) -> Tuple['np.ndarray', 'np.ndarray', List[str]]:
+    """Parse plain dotted-quad lines into start and end address arrays.
+
+    Returns the uint64 starts and ends of the lines it accepted and the lines
+    it left for the pure-Python parser. The rules match the fast path of
+    cidrmath.parse_cidr: 1 to 3 digit octets without leading zeros, up to 255,
+    and an optional prefix length up to 32 (1 to 3 digits here).
+    """
+    # The whole batch as one byte buffer, every line (including the last) ends with a newline
+    buffer = np.frombuffer(('\n'.join(lines) + '\n').encode('utf-8', 'replace'), dtype=np.uint8)
+    is_digit = (buffer >= 48) & (buffer <= 57)
+    is_separator = (buffer == 46) | (buffer == 47) | (buffer == 10)
+
+    # Tokens are the digit runs ended by a separator; each line has its own tokens
+    separators = np.flatnonzero(is_separator)
+    separator_chars = buffer[separators]
+    token_starts = np.concatenate(([0], separators[:-1] + 1))
+    token_lengths = separators - token_starts
+    line_ends = np.flatnonzero(separator_chars == 10)
+    first_tokens = np.concatenate(([0], line_ends[:-1] + 1))
+    token_counts = line_ends - first_tokens + 1
+
+    # Token values from up to three digits, longer tokens are rejected below
+    def digit_at(offset: int) -> 'np.ndarray':
+        positions = np.minimum(token_starts + offset, len(buffer) - 1)
+        return buffer[positions].astype(np.int64) - 48
+
+    first, second, third = digit_at(0), digit_at(1), digit_at(2)
+    values = np.where(token_lengths == 1, first,
+                      np.where(token_lengths == 2, first * 10 + second, first * 100 + second * 10 + third))
+    good_tokens = (token_lengths >= 1) & (token_lengths <= 3)
+
+    # Separators must read ". . . newline" or ". . . / newline"
+    def separator(index: int) -> 'np.ndarray':
+        return separator_chars[np.minimum(first_tokens + index, len(separators) - 1)]
+
+    valid = ((token_counts == 4) | (token_counts == 5)) \
+        & (separator(0) == 46) & (separator(1) == 46) & (separator(2) == 46) \
+        & ((token_counts == 4) | (separator(3) == 47))
+    bad_bytes = np.flatnonzero(~(is_digit | is_separator))
+    valid[np.searchsorted(separators[line_ends], bad_bytes)] = False
+
+    octets = []
+    for index in range(4):
+        token = np.minimum(first_tokens + index, len(values) - 1)
+        value = values[token]
+        leading_zero = (token_lengths[token] > 1) & (first[token] == 0)
+        valid &= good_tokens[token] & (value <= 255) & ~leading_zero
+        octets.append(value)
+    prefix_token = np.minimum(first_tokens + 4, len(values) - 1)
+    prefixlen = np.where(token_counts == 5, values[prefix_token], 32)
+    valid &= (token_counts == 4) | good_tokens[prefix_token]
+    valid &= prefixlen <= 32
+
+    rest = [lines[index] for index in np.flatnonzero(~valid)] if not valid.all() else []
+    octets = [value[valid].astype(np.uint64) for value in octets]
+    prefixlen = prefixlen[valid].astype(np.uint64)
+
+    address = (octets[0] << np.uint64(24)) | (octets[1] << np.uint64(16)) \
+        | (octets[2] << np.uint64(8)) | octets[3]
+    host_mask = (np.uint64(1) << (np.uint64(32) - prefixlen)) - np.uint64(1)
+    starts = address & ~host_mask
+    return starts, starts | host_mask, rest
+
+
+def merge_address_arrays(starts: 'np.ndarray', ends: 'np.ndarray') -> Tuple['np.ndarray', 'np.ndarray']:
+    """Sort intervals and merge the overlapping or adjacent ones, as array operations."""
+    if not len(starts):
+        return starts, ends
+    order = np.argsort(starts, kind='stable')
+    starts, ends = starts[order], ends[order]
+    # An interval starts a new run unless it begins at most one past the furthest end so far
+    reach = np.maximum.accumulate(ends)
+    first = np.flatnonzero(np.concatenate(([True], starts[1:] > reach[:-1] + np.uint64(1))))
+    last = np.append(first[1:] - 1, len(starts) - 1)
+    return starts[first], reach[last]
+
+
+def interval_set_from_arrays(starts: 'np.ndarray', ends: 'np.ndarray') -> IntervalSet:
+    """Wrap merged IPv4 address arrays in an IntervalSet without a Python-level loop."""
+    result = IntervalSet(4)
+    result.starts.frombytes(np.ascontiguousarray(starts, dtype=np.uint64).tobytes())
+    result.ends.frombytes(np.ascontiguousarray(ends, dtype=np.uint64).tobytes())
+    return result
+
+
+def parse_interval_sets_vectorized(items: Iterable[str]) -> Dict[int, IntervalSet]:
+    """Parse IPs and CIDR ranges like intervals.parse_interval_sets, using NumPy when available."""
+    items = iter(items)
+    batch = list(islice(items, VECTOR_BATCH_LINES))
+    if not VECTORIZED or len(batch) < VECTOR_MIN_LINES:
+        return parse_interval_sets(chain(batch, items))
+
+    load_numpy()
+    starts, ends = [], []
+    other_sets = []
+    while batch:
+        batch_starts, batch_ends, rest = parse_ipv4_batch(batch)
+        batch_starts, batch_ends = merge_address_arrays(batch_starts, batch_ends)
+        starts.append(batch_starts)
+        ends.append(batch_ends)
+        if rest:
+            other_sets.append(parse_interval_sets(rest))
+        batch = list(islice(items, VECTOR_BATCH_LINES))
+
+    v4 = interval_set_from_arrays(*merge_address_arrays(np.concatenate(starts), np.concatenate(ends)))
+    return {
+        4: IntervalSet.union_all(4, [v4] + [sets[4] for sets in other_sets]),
+        6: IntervalSet.union_all(6, [sets[6] for sets in other_sets])
+    }
@@ -0,0 +1,105 @@
+import multiprocessing
+import os
+import threading
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from itertools import chain, islice
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from intervals import IntervalSet
+from vectorized import parse_interval_sets_vectorized
+
+# Worker processes for large consolidation and complement jobs (0 or 1 runs them inline).
+# Every gunicorn worker has its own pool, so by default the CPUs are shared between
+# the gunicorn workers (WEB_CONCURRENCY, the variable gunicorn reads its worker count from)
+GUNICORN_WORKERS = max(1, int(os.environ.get('WEB_CONCURRENCY', 1)))
+POOL_WORKERS = int(os.environ.get('IP_TOOLS_POOL_WORKERS', (os.cpu_count() or 1) // GUNICORN_WORKERS))
+
+# Input lines parsed per pool task; smaller inputs never leave the request thread
+PARSE_BATCH_LINES = int(os.environ.get('IP_TOOLS_POOL_BATCH_LINES', 100_000))
+
+# Merged intervals formatted as CIDR strings per pool task
+FORMAT_BATCH_INTERVALS = 50_000
+
+_pool: Optional[Executor] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> Optional[Executor]:
+    """Return the shared process pool, starting it on first use.
+
+    The pool is created lazily so every gunicorn worker gets its own after the
+    fork. Returns None when the pool is disabled.
+    """
+    global _pool
+    if POOL_WORKERS <= 1:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+            _pool = ProcessPoolExecutor(max_workers=POOL_WORKERS, mp_context=context)
+        return _pool
+
+
+def discard_broken_pool() -> None:
+    """Forget a pool whose worker died, the next call starts a fresh one."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+def format_cidrs(interval_set: IntervalSet) -> List[str]:
+    """Format a set as CIDR strings; runs inside the pool workers."""
+    return list(interval_set.iter_cidrs())
+
+
+def parse_interval_sets_parallel(lines: Iterable[str]) -> Dict[int, IntervalSet]:
+    """Parse lines into an IntervalSet per IP version, in parallel for large inputs.
+
+    Lines are handed to the pool in batches while they are still being read, at
+    most two batches per worker at a time. The per-batch sets are then merged
+    in one sweep, which joins intervals that meet at batch boundaries.
+    """
+    lines = iter(lines)
+    first = list(islice(lines, PARSE_BATCH_LINES))
+    pool = get_pool() if len(first) == PARSE_BATCH_LINES else None
+    if pool is None:
+        return parse_interval_sets_vectorized(chain(first, lines))
+
+    pending = deque([pool.submit(parse_interval_sets_vectorized, first)])
+    partial_sets = []
+    try:
+        while True:
+            batch = list(islice(lines, PARSE_BATCH_LINES))
+            if not batch:
+                break
+            pending.append(pool.submit(parse_interval_sets_vectorized, batch))
+            if len(pending) >= 2 * POOL_WORKERS:
+                partial_sets.append(pending.popleft().result())
+        partial_sets.extend(future.result() for future in pending)
+    except BrokenProcessPool:
+        discard_broken_pool()
+        raise
+
+    return {version: IntervalSet.union_all(version, (sets[version] for sets in partial_sets))
+            for version in (4, 6)}
+
+
+def iter_set_cidrs(interval_set: IntervalSet) -> Iterator[str]:
+    """Yield the CIDRs of a set, formatting large sets by address range in the pool."""
+    pool = get_pool() if len(interval_set) > FORMAT_BATCH_INTERVALS else None
+    if pool is None:
+        yield from interval_set.iter_cidrs()
+        return
+
+    # The parts cover consecutive address ranges, so their results simply follow each other
+    try:
+        for cidrs in pool.map(format_cidrs, interval_set.split(FORMAT_BATCH_INTERVALS)):
+            yield from cidrs
+    except BrokenProcessPool:
+        discard_broken_pool()
+        raise